@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import sandbox
+
+# Directory of the game, levels and assets paths are relative to it
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Time between two polls of the sandbox workers, in seconds
+POLL_INTERVAL = 0.01
+
+
+def error_class(output):
+    """
+    Extracts the error class from the output of code_input.user_instructions.
+
+    Args:
+        output: str returned by user_instructions
+
+    Returns: name of the error class (str), or None if the code ran without error
+    """
+    if not output.startswith("/!\\"):
+        return None
+    return output[len("/!\\"):].split(":", 1)[0].strip()
+
+
+def new_result(job):
+    """ Returns the result of a job that has not run yet. """
+    return {
+        "submission": os.path.basename(job["submission"]),
+        "level": job["level"],
+        "passed": False,
+        "completed": False,
+        "blocks_placed": 0,
+        "exec_time": None,
+        "error": None,
+        "output": "",
+    }
+
+
+def grade(job, games, on_print=None):
+    """
+    Runs one submission on one level : the code goes through the user_instructions pipeline, then the player walks
+    to the end of the map in a headless game. Called inside a worker of the sandbox pool, which kills it once over
+    its time limit.
+
+    Args:
+        job: dict with the id, submission path, level and max_time of the job
+        games: headless games of the worker, unused : each submission is graded on a level set up for it alone
+        on_print: unused, the output is only written with the result
+
+    Returns: dict, the result of the job
+    """
+    import code_input
+    from headless import HeadlessGame
+
+    result = new_result(job)
+    result["id"] = job["id"]
+    try:
+        with open(job["submission"], "r") as submission_file:
+            code = submission_file.read()
+
+        arcade_game = HeadlessGame(job["level"])
+        arcade_game.setup()
+        placed_blocks_start = len(arcade_game.scene["Platforms"])
+
+        start = time.perf_counter()
+        output = code_input.user_instructions(arcade_game, code, [])
+        result["exec_time"] = time.perf_counter() - start
+        result["output"] = output
+        result["error"] = error_class(output)
+        result["blocks_placed"] = len(arcade_game.scene["Platforms"]) - placed_blocks_start
+
+        if result["error"] is None:
+            result["completed"] = arcade_game.walk_to_end(job["max_time"])
+            result["passed"] = result["completed"]
+
+    except Exception as error:
+        result["error"] = error.__class__.__name__
+        result["output"] = str(error)
+
+    return result
+
+
+def main():
+    """ Grades a directory of submissions, on one or more levels, using the sandbox workers. """
+    parser = argparse.ArgumentParser(description="Grades a directory of python submissions on the game levels.")
+    parser.add_argument("submissions", help="directory containing the submissions (.py files)")
+    parser.add_argument("-l", "--level", action="append",
+                        help="index of the level in levels.json, can be repeated, or 'all' (default: all)")
+    parser.add_argument("-o", "--output", help="JSONL file the results are written to (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of cores)")
+    parser.add_argument("-t", "--timeout", type=float, default=15,
+                        help="time limit of a job, in seconds (default: 15)")
+    parser.add_argument("--max-time", type=float, default=60,
+                        help="simulated time given to the player to reach the end of the map (default: 60)")
+    args = parser.parse_args()
+
+    submissions_dir = os.path.abspath(args.submissions)
+    submissions = sorted(os.path.join(submissions_dir, name) for name in os.listdir(submissions_dir)
+                         if name.endswith(".py"))
+
+    with open(os.path.join(GAME_DIR, "levels.json"), "r") as read_levels_file:
+        levels_count = len(json.loads(read_levels_file.read()))
+    if not args.level or "all" in args.level:
+        levels = list(range(levels_count))
+    else:
+        levels = [int(level) for level in args.level]
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    # The workers are started from the game directory, a job over its time limit is killed with its worker
+    os.chdir(GAME_DIR)
+    pool = sandbox.SandboxPool(args.jobs, timeout=args.timeout, runner=grade)
+    try:
+        jobs = {}
+        for submission in submissions:
+            for level in levels:
+                job = {"submission": submission, "level": level, "max_time": args.max_time}
+                jobs[pool.submit_job(job)] = job
+
+        while pool.busy():
+            for result in pool.poll():
+                job = jobs.pop(result.pop("id"))
+                if "submission" not in result:
+                    # The job was stopped by the pool, its output tells why
+                    output_text = result["output"]
+                    result = new_result(job)
+                    result["error"] = error_class(output_text)
+                    result["output"] = output_text
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+            time.sleep(POLL_INTERVAL)
+    finally:
+        pool.close()
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
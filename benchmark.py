@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+# Directory of the game, levels and assets paths are relative to it
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Code run on the levels without reference solution, on one line : some levels only allow one
+DEFAULT_SOLUTION = "place_block(0); print(is_empty(0, 0))\n"
+
+# Number of ticks simulated to measure the cost of a tick
+TICKS = 300
+
+# Number of is_empty queries
+QUERIES = 10000
+
+# Relative slowdown over the baseline reported as a regression
+TOLERANCE = 0.25
+
+
+def measure(function, repeat):
+    """
+    Times a function.
+
+    Args:
+        function: function called without arguments
+        repeat: number of calls
+
+    Returns: median duration of a call, in seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def read_solution(solutions_dir, level):
+    """
+    Reads the reference solution of a level, <level index>.py in the solutions directory.
+
+    Args:
+        solutions_dir: directory of the reference solutions, or None
+        level: index of the level
+
+    Returns: str, the code of the solution, DEFAULT_SOLUTION if there is none
+    """
+    if solutions_dir is not None:
+        solution_path = os.path.join(solutions_dir, f"{level}.py")
+        if os.path.exists(solution_path):
+            with open(solution_path, "r") as solution_file:
+                return solution_file.read()
+    return DEFAULT_SOLUTION
+
+
+def benchmark_level(level, solution, repeat):
+    """
+    Measures the costs of a level on a headless game, all in seconds :
+        - setup_cold : setup with empty caches (TMX parsed again), setup : setup with warm caches
+        - tick : one on_update while the player walks to the right
+        - place_block : one call, over as many blocks as the first free slots allow
+        - is_empty : one query on a random tile of the map
+        - user_instructions_cold : the reference solution, neither validated nor compiled yet,
+          user_instructions : the same solution submitted again
+
+    Args:
+        level: index of the level
+        solution: code of the reference solution
+        repeat: number of measures, the median is kept
+
+    Returns: dict of the measures
+    """
+    import code_input
+    import level_cache
+    import user_functions
+    from headless import HeadlessGame
+    from snapshot import reset_level
+
+    arcade_game = HeadlessGame(level)
+    results = {}
+
+    def cold_setup():
+        level_cache.clear()
+        arcade_game.setup()
+
+    results["setup_cold"] = measure(cold_setup, repeat)
+    results["setup"] = measure(arcade_game.setup, repeat)
+
+    # Steady state of the game loop : the player walks to the right, respawning if needed
+    arcade_game.right_pressed = True
+    arcade_game.process_keychange()
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        arcade_game.on_update()
+    results["tick"] = (time.perf_counter() - start) / TICKS
+
+    # Fill every column of the level with blocks, until there is no room left
+    reset_level(arcade_game)
+    placed = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for x_pos in range(len(arcade_game.level_data["first_free_slots"])):
+            try:
+                user_functions.place_block(arcade_game, x_pos)
+            except ValueError:
+                continue
+            placed += 1
+    results["place_block"] = (time.perf_counter() - start) / placed if placed else None
+    user_functions.commit_blocks(arcade_game)
+    reset_level(arcade_game)
+
+    generator = random.Random(level)
+    columns = len(arcade_game.level_data["first_free_slots"])
+    queries = [(generator.randrange(columns), generator.randrange(arcade_game.tile_map.height))
+               for _ in range(QUERIES)]
+    start = time.perf_counter()
+    for x_pos, y_pos in queries:
+        user_functions.is_empty(arcade_game, x_pos, y_pos)
+    results["is_empty"] = (time.perf_counter() - start) / QUERIES
+
+    # A solution rejected by the rules of the level would only measure the error message
+    error = code_input.check_code(arcade_game, solution, [])
+    if error is not None:
+        print(f"Level {level} : the solution is rejected, {error}", file=sys.stderr)
+
+    def cold_instructions():
+        code_input._compiled_codes.clear()
+        code_input.user_instructions(arcade_game, solution, [])
+
+    results["user_instructions_cold"] = measure(cold_instructions, repeat)
+    results["user_instructions"] = measure(lambda: code_input.user_instructions(arcade_game, solution, []), repeat)
+    results["output"] = code_input.user_instructions(arcade_game, solution, [])
+
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Lists the measures slower than the baseline by more than the tolerance.
+
+    Args:
+        results: dict returned by main, {"levels": {level name: measures}}
+        baseline: dict of the same format
+        tolerance: relative slowdown allowed
+
+    Returns: list of (level name, measure, baseline value, value) tuples
+    """
+    regressions = []
+    for name, measures in results["levels"].items():
+        baseline_measures = baseline["levels"].get(name, {})
+        for measure_name, value in measures.items():
+            baseline_value = baseline_measures.get(measure_name)
+            if not isinstance(value, float) or not isinstance(baseline_value, float):
+                continue
+            if value > baseline_value * (1 + tolerance):
+                regressions.append((name, measure_name, baseline_value, value))
+    return regressions
+
+
+def main():
+    """ Benchmarks the levels, writes the results as JSON and compares them with a baseline. """
+    parser = argparse.ArgumentParser(description="Measures the setup, tick, placement and query costs of the levels.")
+    parser.add_argument("-l", "--level", type=int, action="append",
+                        help="index of the level in levels.json, can be repeated (default: all)")
+    parser.add_argument("-s", "--solutions", help="directory of the reference solutions, named <level index>.py")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of measures, the median is kept")
+    parser.add_argument("-o", "--output", help="JSON file the results are written to (default: stdout)")
+    parser.add_argument("-b", "--baseline", help="JSON file of previous results to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"relative slowdown reported as a regression (default: {TOLERANCE})")
+    args = parser.parse_args()
+
+    solutions_dir = os.path.abspath(args.solutions) if args.solutions else None
+    os.chdir(GAME_DIR)
+    sys.path.insert(0, GAME_DIR)
+    import level_cache
+
+    levels = level_cache.get_levels()
+    indexes = args.level if args.level else range(len(levels))
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "levels": {},
+    }
+    for level in indexes:
+        print(f"Level {level} : {levels[level]['name']}", file=sys.stderr)
+        results["levels"][levels[level]["name"]] = benchmark_level(level, read_solution(solutions_dir, level),
+                                                                   args.repeat)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4)
+    else:
+        print(json.dumps(results, indent=4))
+
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for name, measure_name, baseline_value, value in regressions:
+            print(f"{name} : {measure_name} {baseline_value * 1000:.3f} ms -> {value * 1000:.3f} ms "
+                  f"({value / baseline_value - 1:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
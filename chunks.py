@@ -0,0 +1,128 @@
+import math
+
+import arcade
+
+# Width of a chunk, in pixels
+CHUNK_WIDTH = 256
+
+
+class ChunkedLayer:
+    """
+    Sprites of a layer split into vertical strips (chunks), each with its own sprite list, so that only the chunks
+    in view are drawn.
+    A sprite belongs to the chunk of its center, and the extent of each chunk covers all of its sprites. The sprites
+    stay in the sprite list of the layer, which is still used by the rest of the game ; removing a sprite from its
+    sprite lists removes it from its chunk as well.
+    """
+
+    def __init__(self, sprite_list, chunk_width=CHUNK_WIDTH):
+        """
+        Splits the sprites of a layer into chunks.
+
+        Args:
+            sprite_list: sprite list of the layer
+            chunk_width: width of a chunk, in pixels
+        """
+        self.sprite_list = sprite_list
+        self.chunk_width = chunk_width
+        # Sprite list of each chunk, and its extent [left, right] in pixels, by index of the chunk
+        self.chunks = {}
+        self.extents = {}
+        self.add_sprites(sprite_list)
+
+    def add_sprites(self, sprites):
+        """
+        Adds sprites to the chunks. They must already be in the sprite list of the layer.
+
+        Args:
+            sprites: list of arcade.Sprite
+
+        Returns: None
+        """
+        for sprite in sprites:
+            index = math.floor(sprite.center_x / self.chunk_width)
+            if index not in self.chunks:
+                self.chunks[index] = arcade.SpriteList()
+                self.extents[index] = [sprite.center_x, sprite.center_x]
+            self.chunks[index].append(sprite)
+
+            # Half of the diagonal of the sprite, whatever its angle
+            radius = math.hypot(sprite.width, sprite.height) / 2
+            extent = self.extents[index]
+            extent[0] = min(extent[0], sprite.center_x - radius)
+            extent[1] = max(extent[1], sprite.center_x + radius)
+
+    def draw(self, left, right, **kwargs):
+        """
+        Draws the chunks of the layer in view.
+
+        Args:
+            left: left of the view, in pixels
+            right: right of the view, in pixels
+            kwargs: options of arcade.SpriteList.draw
+
+        Returns: number of chunks drawn
+        """
+        if not self.sprite_list.visible:
+            return 0
+
+        drawn = 0
+        for index, chunk in self.chunks.items():
+            extent = self.extents[index]
+            if extent[1] > left and extent[0] < right:
+                chunk.draw(**kwargs)
+                drawn += 1
+        return drawn
+
+
+class ChunkedScene:
+    """
+    Draws a scene like arcade.Scene.draw, but only the chunks in view of its large layers (the layers of the tile map).
+    The other sprite lists of the scene (player, NPCs) are drawn entirely.
+    """
+
+    def __init__(self, scene, layer_names, chunk_width=CHUNK_WIDTH):
+        """
+        Splits the layers of a scene into chunks.
+
+        Args:
+            scene: arcade.Scene
+            layer_names: names of the layers split into chunks, those missing from the scene are ignored
+            chunk_width: width of a chunk, in pixels
+        """
+        self.scene = scene
+        self.layers = {name: ChunkedLayer(scene[name], chunk_width)
+                       for name in layer_names if name in scene.name_mapping}
+        # Chunked layer of each sprite list, the scene keeps its sprite lists in drawing order
+        self.layers_by_list = {id(layer.sprite_list): layer for layer in self.layers.values()}
+
+    def add_sprites(self, name, sprites):
+        """
+        Adds sprites added to a layer of the scene to its chunks.
+
+        Args:
+            name: name of the layer
+            sprites: list of arcade.Sprite
+
+        Returns: None
+        """
+        if name in self.layers:
+            self.layers[name].add_sprites(sprites)
+
+    def draw(self, left, right, **kwargs):
+        """
+        Draws the scene, its layers in the same order as arcade.Scene.draw.
+
+        Args:
+            left: left of the view, in pixels
+            right: right of the view, in pixels
+            kwargs: options of arcade.SpriteList.draw
+
+        Returns: None
+        """
+        for sprite_list in self.scene.sprite_lists:
+            layer = self.layers_by_list.get(id(sprite_list))
+            if layer is None:
+                sprite_list.draw(**kwargs)
+            else:
+                layer.draw(left, right, **kwargs)
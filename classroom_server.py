@@ -0,0 +1,445 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import arcade
+
+import level_cache
+import sandbox
+from headless import HeadlessGame
+
+# Directory of the game, levels and assets paths are relative to it
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Address the server listens on, only the local machine by default
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Number of times per second the sessions are updated ; each update simulates the steps of SIM_DT elapsed since the
+# previous one, like the frames of the game
+UPDATE_RATE = 60
+
+# Default limits of the server
+MAX_SESSIONS = 64
+MAX_BODY_SIZE = 64 * 1024
+# Submissions of a session running in the sandbox at the same time, the next ones are refused until one has run
+MAX_PENDING_SUBMISSIONS = 4
+
+# Keys a student can press, by name
+KEYS = {
+    "left": arcade.key.LEFT,
+    "right": arcade.key.RIGHT,
+}
+
+SESSION_PATH = re.compile(r"^/sessions/([0-9a-f]+)(?:/(keys|code|reset))?$")
+
+
+class Session:
+    """
+    Game of one student on the server : a headless game with its own level, player and blocks, updated in real time
+    like game.Game. The layers only read by the game are shared with the other sessions (see HeadlessGame).
+    The requests of the student are queued, and handled by the next update of the session, so that the game is only
+    ever modified by one thread at a time.
+    """
+
+    def __init__(self, session_id, level=0, frog=False):
+        """
+        Sets up the level of the session.
+
+        Args:
+            session_id: id of the session (str)
+            level: index of the level played first, in levels.json
+            frog: True if the player plays the frog
+        """
+        self.id = session_id
+        self.game = HeadlessGame(level, frog, advance_levels=True, share_layers=True)
+        self.game.setup()
+        self.game.advance_levels = level + 1 < len(self.game.levels)
+
+        self.last_update = time.monotonic()
+        # Held while the session is updated, and while its state is read
+        self.lock = threading.Lock()
+        # Future of the update running in the pool, if any
+        self.future = None
+
+        # Requests waiting for the next update : ("key", key, pressed) or ("result", result)
+        self.events = deque()
+        # Results of the submissions applied since the state was last read, and number of submissions running
+        self.results = []
+        self.pending = 0
+        # Error that stopped the session, if any
+        self.error = None
+
+    def update(self, now):
+        """
+        Handles the queued requests, then simulates the steps elapsed since the last update. Runs in the pool.
+
+        Args:
+            now: time of the update (time.monotonic())
+
+        Returns: None
+        """
+        with self.lock:
+            try:
+                while self.events:
+                    self.handle(self.events.popleft())
+                self.game.on_update(now - self.last_update)
+                # The last level is only marked as completed, there is no next level to load
+                self.game.advance_levels = self.game.save["current_level"] + 1 < len(self.game.levels)
+            except Exception as error:
+                self.error = f"{error.__class__.__name__} : {error}"
+            self.last_update = now
+
+    def reset(self):
+        """
+        Sets the level up again, right away : a session stopped by an error is updated again.
+
+        Returns: None
+        """
+        with self.lock:
+            try:
+                self.game.setup()
+                self.error = None
+            except Exception as error:
+                self.error = f"{error.__class__.__name__} : {error}"
+            self.last_update = time.monotonic()
+
+    def handle(self, event):
+        """
+        Applies a request of the student to the game.
+
+        Args:
+            event: tuple, see events
+
+        Returns: None
+        """
+        if event[0] == "key":
+            if event[2]:
+                self.game.on_key_press(event[1])
+            else:
+                self.game.on_key_release(event[1])
+        elif event[0] == "result":
+            result = event[1]
+            output = sandbox.apply_result(self.game, result)
+            error = output.startswith("/!\\")
+            if error:
+                self.game.can_move = False
+            self.results.append({"job": result["id"], "output": output, "error": error})
+            self.pending -= 1
+
+    def state(self):
+        """
+        Returns the state of the game, and the results of the submissions applied since the last call.
+
+        Returns: dict
+        """
+        with self.lock:
+            game = self.game
+            results, self.results = self.results, []
+            return {
+                "session": self.id,
+                "level": game.save["current_level"],
+                "frog": game.frog,
+                "position": list(game.player_sprite.position),
+                "can_move": game.can_move,
+                "completed": game.completed,
+                "blocks": len(game.scene["Platforms"]) - game.level_snapshot.platforms_count,
+                "pending": self.pending,
+                "results": results,
+                "error": self.error,
+            }
+
+
+class ClassroomServer:
+    """
+    Hosts the games of a whole classroom in one process, in place of a game process per student.
+    The sessions are updated UPDATE_RATE times per second by a pool of threads, so that a slow update (a level set
+    up again) does not hold the other sessions back. The submitted code runs in a shared sandbox pool, the same as
+    the game uses.
+    """
+
+    def __init__(self, update_workers=4, sandbox_workers=2, max_sessions=MAX_SESSIONS):
+        """
+        Starts the sandbox workers.
+
+        Args:
+            update_workers: number of threads updating the sessions
+            sandbox_workers: number of processes running the submitted code
+            max_sessions: maximum number of sessions open at the same time
+        """
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=update_workers, thread_name_prefix="session")
+
+        # The pool is used by the scheduler and the request threads
+        self.sandbox = sandbox.SandboxPool(sandbox_workers)
+        self.sandbox_lock = threading.Lock()
+        # Session of each job running in the sandbox
+        self.jobs = {}
+
+        self.stopped = threading.Event()
+        self.scheduler = threading.Thread(target=self.run, name="scheduler", daemon=True)
+
+    def create_session(self, level=0, frog=False):
+        """
+        Opens a new session.
+
+        Args:
+            level: index of the level played first, in levels.json
+            frog: True if the player plays the frog
+
+        Returns: Session
+        Raises: ValueError if the level does not exist, RuntimeError if the server already has max_sessions sessions.
+        """
+        if not 0 <= level < len(level_cache.get_levels()):
+            raise ValueError(f"Unknown level {level}.")
+        with self.sessions_lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise RuntimeError(f"The server is full ({self.max_sessions} sessions).")
+
+        # Set up outside of the lock, the first session of a level builds its shared layers
+        session = Session(uuid.uuid4().hex, level, frog)
+        with self.sessions_lock:
+            self.sessions[session.id] = session
+        return session
+
+    def get_session(self, session_id):
+        """ Returns the session of an id, or None if there is none. """
+        with self.sessions_lock:
+            return self.sessions.get(session_id)
+
+    def close_session(self, session_id):
+        """ Closes a session, the results of its running submissions are dropped. """
+        with self.sessions_lock:
+            self.sessions.pop(session_id, None)
+
+    def submit(self, session, code):
+        """
+        Runs code submitted by a student in the sandbox, its result is applied to the session once it has run.
+
+        Args:
+            session: Session
+            code: str containing code performed by user
+
+        Returns: id of the job
+        Raises: RuntimeError if the session already has MAX_PENDING_SUBMISSIONS submissions running.
+        """
+        with session.lock:
+            if session.pending >= MAX_PENDING_SUBMISSIONS:
+                raise RuntimeError(f"Too many submissions running ({MAX_PENDING_SUBMISSIONS}), wait for their results.")
+            level = session.game.save["current_level"]
+            frog = session.game.frog
+            session.pending += 1
+        with self.sandbox_lock:
+            job_id = self.sandbox.submit(code, level, frog)
+            self.jobs[job_id] = session
+        return job_id
+
+    def poll_sandbox(self):
+        """ Queues the results of the finished jobs in their sessions. """
+        with self.sandbox_lock:
+            if not self.sandbox.busy():
+                return
+            results = self.sandbox.poll()
+            sessions = [self.jobs.pop(result["id"]) for result in results]
+
+        for session, result in zip(sessions, results):
+            session.events.append(("result", result))
+
+    def run(self):
+        """ Updates the sessions at a fixed rate until the server is stopped. Runs in the scheduler thread. """
+        period = 1 / UPDATE_RATE
+        next_update = time.monotonic()
+        while not self.stopped.is_set():
+            self.poll_sandbox()
+
+            now = time.monotonic()
+            with self.sessions_lock:
+                sessions = list(self.sessions.values())
+            for session in sessions:
+                # A session still running its previous update catches up at the next one
+                if session.error is None and (session.future is None or session.future.done()):
+                    session.future = self.executor.submit(session.update, now)
+
+            next_update += period
+            if next_update < now:
+                next_update = now
+            self.stopped.wait(next_update - time.monotonic())
+
+    def start(self):
+        """ Starts updating the sessions. """
+        self.scheduler.start()
+
+    def stop(self):
+        """ Stops updating the sessions, and stops the sandbox workers. """
+        self.stopped.set()
+        if self.scheduler.is_alive():
+            self.scheduler.join()
+        self.executor.shutdown()
+        with self.sandbox_lock:
+            self.sandbox.close()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON API of the server, see the usage documentation :
+
+    - POST /sessions : opens a session, with the optional level and frog of the body
+    - GET /sessions/<id> : state of the session, and results of its submissions
+    - POST /sessions/<id>/keys : presses or releases a key, {"key": "left" or "right", "pressed": bool}
+    - POST /sessions/<id>/code : submits code, {"code": str}
+    - POST /sessions/<id>/reset : sets the level up again
+    - DELETE /sessions/<id> : closes the session
+    """
+
+    # Set on the subclass created by serve
+    server_instance = None
+
+    def send_json(self, status, data):
+        """ Sends a JSON response. """
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        """
+        Reads the JSON body of the request.
+
+        Returns: dict, empty if there is no body
+        Raises: ValueError if the body length is invalid or too large, or if the body is not a JSON object.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        if length < 0:
+            raise ValueError("The Content-Length must not be negative.")
+        if length > MAX_BODY_SIZE:
+            raise ValueError(f"The body is larger than {MAX_BODY_SIZE} bytes.")
+        data = json.loads(self.rfile.read(length) or b"{}")
+        if not isinstance(data, dict):
+            raise ValueError("The body must be a JSON object.")
+        return data
+
+    def do_GET(self):
+        match = SESSION_PATH.match(self.path)
+        session = self.server_instance.get_session(match.group(1)) if match and not match.group(2) else None
+        if session is None:
+            self.send_json(404, {"error": "Unknown session."})
+        else:
+            self.send_json(200, session.state())
+
+    def do_POST(self):
+        try:
+            data = self.read_json()
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+            return
+
+        if self.path == "/sessions":
+            self.post_session(data)
+            return
+
+        match = SESSION_PATH.match(self.path)
+        session = self.server_instance.get_session(match.group(1)) if match and match.group(2) else None
+        if session is None:
+            self.send_json(404, {"error": "Unknown session."})
+        elif match.group(2) == "keys":
+            if data.get("key") not in KEYS:
+                self.send_json(400, {"error": f"The key must be one of {', '.join(KEYS)}."})
+                return
+            session.events.append(("key", KEYS[data["key"]], bool(data.get("pressed", True))))
+            self.send_json(202, {})
+        elif match.group(2) == "code":
+            if not isinstance(data.get("code"), str):
+                self.send_json(400, {"error": "The code must be a string."})
+                return
+            try:
+                job_id = self.server_instance.submit(session, data["code"])
+            except RuntimeError as error:
+                self.send_json(429, {"error": str(error)})
+                return
+            self.send_json(202, {"job": job_id})
+        else:
+            session.reset()
+            self.send_json(200, {})
+
+    def post_session(self, data):
+        """ Opens a session. """
+        try:
+            level = int(data.get("level", 0))
+            frog = bool(data.get("frog", False))
+            session = self.server_instance.create_session(level, frog)
+        except (ValueError, TypeError) as error:
+            self.send_json(400, {"error": str(error)})
+        except RuntimeError as error:
+            self.send_json(503, {"error": str(error)})
+        else:
+            self.send_json(201, session.state())
+
+    def do_DELETE(self):
+        match = SESSION_PATH.match(self.path)
+        if match is None or match.group(2) or self.server_instance.get_session(match.group(1)) is None:
+            self.send_json(404, {"error": "Unknown session."})
+            return
+        self.server_instance.close_session(match.group(1))
+        self.send_json(200, {})
+
+    def log_message(self, format, *args):
+        """ Requests are not logged, the students poll their state many times per second. """
+
+
+def serve(server, host=HOST, port=PORT):
+    """
+    Serves the API of a classroom server until interrupted.
+
+    Args:
+        server: ClassroomServer
+        host: address listened on
+        port: port listened on
+
+    Returns: None
+    """
+    handler = type("Handler", (RequestHandler,), {"server_instance": server})
+    http_server = ThreadingHTTPServer((host, port), handler)
+    http_server.daemon_threads = True
+
+    server.start()
+    print(f"Classroom server listening on http://{host}:{http_server.server_address[1]}", file=sys.stderr)
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        server.stop()
+
+
+def main():
+    """ Starts a classroom server. """
+    parser = argparse.ArgumentParser(description="Hosts the games of a classroom in one process, through an HTTP API.")
+    parser.add_argument("--host", default=HOST, help=f"address listened on (default: {HOST})")
+    parser.add_argument("-p", "--port", type=int, default=PORT, help=f"port listened on (default: {PORT})")
+    parser.add_argument("-s", "--max-sessions", type=int, default=MAX_SESSIONS,
+                        help=f"maximum number of sessions (default: {MAX_SESSIONS})")
+    parser.add_argument("-u", "--update-workers", type=int, default=4,
+                        help="number of threads updating the sessions (default: 4)")
+    parser.add_argument("-j", "--sandbox-workers", type=int, default=2,
+                        help="number of processes running the submitted code (default: 2)")
+    args = parser.parse_args()
+
+    os.chdir(GAME_DIR)
+    serve(ClassroomServer(args.update_workers, args.sandbox_workers, args.max_sessions), args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
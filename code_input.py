@@ -1,13 +1,26 @@
-import json
 # import signal
+import ast
+import hashlib
+from collections import OrderedDict
 
-# Might be used in exec(code), do not remove !
+import validator
+from snapshot import reset_level
+
+# Game API available to the user code
 from user_functions import place_block
 from user_functions import is_empty
 from user_functions import frog
+from user_functions import commit_blocks
+
+# Functions of the game API taking the game as first argument
+GAME_FUNCTIONS = ("place_block", "is_empty", "frog")
+
+# Compiled user codes, by (source hash, level, forbidden words), least recently used first
+MAX_COMPILED_CODES = 256
+_compiled_codes = OrderedDict()
 
 
-def user_instructions(game, code, forbidden=[], timeout=15):
+def user_instructions(game, code, forbidden=None, timeout=15):
     """
     Function checking, executing user input code and handling errors.
 
@@ -19,33 +32,116 @@ def user_instructions(game, code, forbidden=[], timeout=15):
     Returns: Buffer text or error.
     Raises: Environment error if forbidden code is detected.
     """
+    error = check_code(game, code, forbidden)
+    if error:
+        return error
+
+    return run_code(game, code, forbidden)
+
+
+def check_code(game, code, forbidden=None):
+    """
+    Checks the user input code against the rules of the current level, without running it.
+    The code is parsed once, and its syntax tree is checked against the rule set of the level.
+
+    Args:
+        game: Game object, whose level data holds the rules
+        code: str containing code performed by user
+        forbidden: list (refers to instructions denied on top of those of the current level).
+    Returns: Error text, or None if the code can be run.
+    """
+    error, _ = prepare_code(game, code, forbidden)
+    return error
+
+
+def prepare_code(game, code, forbidden=None):
+    """
+    Checks the user input code, then compiles it with the calls to the game API rewritten.
+    The result is cached by source hash and level, so a submission seen before is neither parsed nor compiled again.
+
+    Args:
+        game: Game object, whose level data holds the rules
+        code: str containing code performed by user
+        forbidden: list (refers to instructions denied on top of those of the current level).
+    Returns: tuple (error, code_object), error being None if the code can be run, code_object None otherwise.
+    """
+    key = (hashlib.sha256(code.encode("utf-8")).digest(), game.save["current_level"], tuple(forbidden or ()))
+    if key in _compiled_codes:
+        _compiled_codes.move_to_end(key)
+        return _compiled_codes[key]
+
+    prepared = _compile_code(game, code, forbidden)
+    _compiled_codes[key] = prepared
+    if len(_compiled_codes) > MAX_COMPILED_CODES:
+        _compiled_codes.popitem(last=False)
+    return prepared
+
+
+def _compile_code(game, code, forbidden):
+    """ Checks and compiles the user input code, see prepare_code. """
 
     # check for unsafe or context-forbidden instructions in code
 
     if code.count("\n") > game.level_data["max_lines"] or game.level_data["max_lines"] == 0:
-        return f"/!\\ Error : the maximum of lines of code in this level is {game.level_data['max_lines']}."
+        return f"/!\\ Error : the maximum of lines of code in this level is {game.level_data['max_lines']}.", None
+
+    try:
+        tree, violations = validator.validate(code, validator.get_rules(game.level_data, forbidden))
+    except SyntaxError as error:
+        return f'/!\\ {error.__class__.__name__} : {error}\n', None
+
+    if violations:
+        violation = violations[0]
+        return f"/!\\ Error : Forbidden instruction ('{violation.word}') found in code, " \
+               f"line {violation.lineno}, column {violation.col_offset + 1}.", None
+
+    tree = ast.fix_missing_locations(GameCallTransformer().visit(tree))
+    return None, compile(tree, "<user code>", "exec")
+
+
+class GameCallTransformer(ast.NodeTransformer):
+    """
+    Rewrites the syntax tree of the user code : the game is passed as first argument to the functions of the
+    game API, and print writes into the artificial buffer.
+    """
 
-    with open("assets/text/unsafe_words.json", "r") as unsafe_json:
-        unsafe = json.loads(unsafe_json.read())  # load from json unsafe words
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if isinstance(node.func, ast.Name):
+            if node.func.id in GAME_FUNCTIONS:
+                node.args.insert(0, ast.Name(id="game", ctx=ast.Load()))
+            elif node.func.id == "print":
+                node.func = ast.Name(id="artificial_print", ctx=ast.Load())
+        return node
 
-    forbidden += game.level_data["forbidden_functions"]
-    forbidden += unsafe
 
-    for word in forbidden:
-        if word in code:
-            return f"/!\\ Error : Forbidden instruction ('{word}') found in code."
+def run_code(game, code, forbidden=None, on_print=None):
+    """
+    Resets the level, then executes the user input code. The code must have been checked by check_code.
+
+    Args:
+        game : Game object that can be called inside the exec function to be modified (adding blocks)
+        code: str containing code performed by user
+        forbidden: list, the one given to check_code (the compiled code is then taken from the cache).
+        on_print: function called with the text of each print of the code, while the code runs
+    Returns: Buffer text or error.
+    """
+    error, code_object = prepare_code(game, code, forbidden)
+    if error:
+        return error
 
-    # artificial buffer + code modification
+    # artificial buffer, filled by the print calls of the code
 
-    artificial_buffer = ""
-    code = code.replace('print(', "artificial_buffer +=  '\\n' + str(")
-    code = code.replace('place_block(', 'place_block(game,')
-    code = code.replace('is_empty(', 'is_empty(game,')
-    code = code.replace('frog(', 'frog(game,')
+    artificial_buffer = []
 
-    # defining locals dictionary passed into exec, so that variables are affected in the function scope
+    def artificial_print(*values, sep=" "):
+        artificial_buffer.append("\n" + sep.join(str(value) for value in values))
+        if on_print is not None:
+            on_print(artificial_buffer[-1])
 
-    local_variables = locals()
+    # variables of the code, with the game API
+    namespace = {"game": game, "place_block": place_block, "is_empty": is_empty, "frog": frog,
+                 "artificial_print": artificial_print}
     # TODO adapt SIGALRM to windows
 
     # signal alarm for timeout
@@ -54,19 +150,20 @@ def user_instructions(game, code, forbidden=[], timeout=15):
 
     # execution
     try:
-        game.setup()
-        exec(code, globals(), local_variables)
-        artificial_buffer = local_variables['artificial_buffer']
+        # Roll the level back to its initial state
+        reset_level(game)
+        exec(code_object, namespace)
 
     # handling errors
     except Exception as error:
-        artificial_buffer = local_variables['artificial_buffer']
-        return f'/!\\ {error.__class__.__name__} : {error}\n{artificial_buffer}'
+        return f'/!\\ {error.__class__.__name__} : {error}\n{"".join(artificial_buffer)}'
 
-    # finally:
-    #    signal.alarm(0)
+    finally:
+        # Add all the blocks placed by the code at once
+        commit_blocks(game)
+        # signal.alarm(0)
 
-    return artificial_buffer
+    return "".join(artificial_buffer)
 
 
 def timeout_handler(signum, frame):
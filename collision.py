@@ -0,0 +1,128 @@
+import arcade
+
+# Tolerance on the positions of the tiles, in pixels
+EPSILON = 1e-6
+
+
+def is_full_tile(sprite, tile_size):
+    """
+    Checks if the hit box of a sprite is exactly one tile of the grid.
+
+    Args:
+        sprite: arcade.Sprite
+        tile_size: size of one tile in pixels, adapted to the level scaling
+
+    Returns: bool
+    """
+    hit_box = sprite.get_adjusted_hit_box()
+    if len(hit_box) != 4:
+        return False
+
+    xs = sorted(point[0] for point in hit_box)
+    ys = sorted(point[1] for point in hit_box)
+    column = round(xs[0] / tile_size)
+    row = round(ys[0] / tile_size)
+    return abs(xs[0] - column * tile_size) < EPSILON and abs(xs[1] - xs[0]) < EPSILON \
+        and abs(xs[2] - (column + 1) * tile_size) < EPSILON and abs(xs[3] - xs[2]) < EPSILON \
+        and abs(ys[0] - row * tile_size) < EPSILON and abs(ys[1] - ys[0]) < EPSILON \
+        and abs(ys[2] - (row + 1) * tile_size) < EPSILON and abs(ys[3] - ys[2]) < EPSILON
+
+
+def merge_tiles(tiles):
+    """
+    Merges tiles into rectangles : the tiles of each row are merged into horizontal runs, then the runs spanning the
+    same columns in consecutive rows are merged together.
+
+    Args:
+        tiles: set of (column, row) tuples
+
+    Returns: list of (column, row, columns, rows) tuples, the bottom-left tile and the size of each rectangle
+    """
+    runs_by_row = {}
+    for column, row in sorted(tiles, key=lambda tile: (tile[1], tile[0])):
+        runs = runs_by_row.setdefault(row, [])
+        if runs and runs[-1][0] + runs[-1][1] == column:
+            runs[-1][1] += 1
+        else:
+            runs.append([column, 1])
+
+    rectangles = []
+    # Rectangles still growing upwards, by (first column, number of columns)
+    open_rectangles = {}
+    for row in sorted(runs_by_row):
+        next_open_rectangles = {}
+        for column, columns in runs_by_row[row]:
+            rectangle = open_rectangles.pop((column, columns), None)
+            if rectangle is not None and rectangle[1] + rectangle[3] == row:
+                rectangle[3] += 1
+            else:
+                rectangle = [column, row, columns, 1]
+                rectangles.append(rectangle)
+            next_open_rectangles[column, columns] = rectangle
+        open_rectangles = next_open_rectangles
+
+    return [tuple(rectangle) for rectangle in rectangles]
+
+
+def create_rectangle(left, bottom, width, height):
+    """
+    Creates an invisible sprite used only for collisions.
+
+    Args:
+        left: left of the rectangle, in pixels
+        bottom: bottom of the rectangle, in pixels
+        width: width of the rectangle, in pixels
+        height: height of the rectangle, in pixels
+
+    Returns: arcade.Sprite
+    """
+    rectangle = arcade.Sprite()
+    rectangle.width = width
+    rectangle.height = height
+    rectangle.set_hit_box([(-width / 2, -height / 2), (width / 2, -height / 2),
+                           (width / 2, height / 2), (-width / 2, height / 2)])
+    rectangle.center_x = left + width / 2
+    rectangle.center_y = bottom + height / 2
+    return rectangle
+
+
+class CollisionLayer:
+    """
+    Static collision geometry of the platforms, given to the physics engine instead of the sprites of the layer.
+    The tiles whose hit box is a full tile are merged into a few rectangles when the level is loaded ; the other
+    tiles and the blocks placed by the user code are kept as they are.
+    The blocks are added by commit_blocks, and leave the layer with their other sprite lists when the level is reset.
+    """
+
+    def __init__(self, platforms, tile_size):
+        """
+        Builds the geometry of a platforms layer.
+
+        Args:
+            platforms: sprite list of the platforms
+            tile_size: size of one tile in pixels, adapted to the level scaling
+        """
+        self.tile_size = tile_size
+        self.sprite_list = arcade.SpriteList(use_spatial_hash=True)
+
+        tiles = set()
+        for sprite in platforms:
+            if sprite.change_x == 0 and sprite.change_y == 0 and is_full_tile(sprite, tile_size):
+                tiles.add((round(sprite.left / tile_size), round(sprite.bottom / tile_size)))
+            else:
+                self.sprite_list.append(sprite)
+
+        for column, row, columns, rows in merge_tiles(tiles):
+            self.sprite_list.append(create_rectangle(column * tile_size, row * tile_size,
+                                                     columns * tile_size, rows * tile_size))
+
+    def add_sprites(self, sprites):
+        """
+        Adds sprites (blocks placed by the user code) to the geometry.
+
+        Args:
+            sprites: list of arcade.Sprite
+
+        Returns: None
+        """
+        self.sprite_list.extend(sprites)
@@ -0,0 +1,25 @@
+# Constants of the game, kept apart from game.py so that they can be read without importing arcade
+
+# Window
+SCREEN_WIDTH = 1000
+SCREEN_HEIGHT = 563
+SCREEN_TITLE = "Game"
+
+# Index of the screen the game is displayed on
+SCREEN_NUM = 0
+
+# Levels
+LAYER_NAME_NPC = "Npc"
+GRAVITY = 1.5
+# Size of a tile in the TMX files, in pixels
+TILE_SIZE = 16
+
+# Options specific to each layer of the tile maps
+LAYER_OPTIONS = {
+    "Platforms": {
+        "use_spatial_hash": True,
+    },
+    "Background": {
+        "use_spatial_hash": True,
+    },
+}
@@ -18,6 +18,50 @@ def load_texture_pair(filename):
     ]
 
 
+# Textures of the characters, loaded once and shared by every entity
+_character_textures = {}
+
+
+def get_character_textures(frog):
+    """
+    Returns the textures of a character, loaded from disk on the first call only.
+    Mirrored textures and the hit box are computed at the same time.
+
+    Args:
+        frog: True for the frog, False for the human character
+
+    Returns: dict with the "idle" texture pair, the "walk" list of texture pairs (empty for the frog) and the
+    "hit_box" points
+    """
+    if frog not in _character_textures:
+        if frog:
+            idle_texture_pair = load_texture_pair("assets/backgrounds/frog.png")
+            walk_textures = []
+        else:
+            main_path = f"assets/characters"
+            idle_texture_pair = load_texture_pair(f"{main_path}/Personnage.png")
+
+            # Load textures for walking
+            walk_textures = []
+            for i in range(8):
+                walk_textures.append(load_texture_pair(f"{main_path}/walk/char_walk_{i}.png"))
+
+        _character_textures[frog] = {
+            "idle": idle_texture_pair,
+            "walk": walk_textures,
+            # Hit box will be set based on the first image used
+            "hit_box": idle_texture_pair[0].hit_box_points,
+        }
+
+    return _character_textures[frog]
+
+
+def preload_textures():
+    """ Loads the textures of both characters, so that switching character never touches the disk. """
+    get_character_textures(False)
+    get_character_textures(True)
+
+
 class Entity(arcade.Sprite):
     """ Basic structure of every sprite """
 
@@ -33,25 +77,14 @@ class Entity(arcade.Sprite):
         # Used for image sequences
         self.cur_texture = 0
 
-        if self.frog:
-            image = "assets/backgrounds/frog.png"
-            self.texture = arcade.load_texture(image)
-            self.set_hit_box(self.texture.hit_box_points)
-
-        else:
-            main_path = f"assets/characters"
-            self.idle_texture_pair = load_texture_pair(f"{main_path}/Personnage.png")
-
-            # Load textures for walking
-            self.walk_textures = []
-            for i in range(8):
-                texture = load_texture_pair(f"{main_path}/walk/char_walk_{i}.png")
-                self.walk_textures.append(texture)
+        textures = get_character_textures(self.frog)
+        if not self.frog:
+            self.idle_texture_pair = textures["idle"]
+            self.walk_textures = textures["walk"]
 
-            # Set the initial texture
-            self.texture = self.idle_texture_pair[0]
-            # Hit box will be set based on the first image used
-            self.set_hit_box(self.texture.hit_box_points)
+        # Set the initial texture
+        self.texture = textures["idle"][0]
+        self.set_hit_box(textures["hit_box"])
 
 
 class PlayerCharacter(Entity):
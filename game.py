@@ -2,28 +2,37 @@ import arcade
 import arcade.gui as gui
 
 import pyglet
-import json
 
-import code_input
+import chunks
 import npc
 import utils
 import entities
-
+import level_cache
+import profiler
+import protocol
+import replay
+import sandbox
+import simulation
+import startup
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE, SCREEN_NUM, TILE_SIZE, \
+    LAYER_OPTIONS
 from main_menu import MenuView, HelpView
+from snapshot import reset_level
+
+
+def get_screen(screen_num=SCREEN_NUM):
+    """
+    Returns the screen the game is displayed on.
+    Displays are only enumerated when this is called, so that importing this module does not need a display.
 
-# Constants
-SCREEN_WIDTH = 1000
-SCREEN_HEIGHT = 563
-SCREEN_TITLE = "Game"
-LAYER_NAME_NPC = "Npc"
-GRAVITY = 1.5
-TILE_SIZE = 16
+    Args:
+        screen_num: index of the screen in the display
 
+    Returns: pyglet Screen object
+    """
+    return pyglet.canvas.Display().get_screens()[screen_num]
 
-# Set up the screen
-SCREEN_NUM = 0
-SCREENS = pyglet.canvas.Display().get_screens()
-SCREEN = SCREENS[SCREEN_NUM]
 
 class MainMenu(arcade.View):
     """Class that manages the 'menu' view."""
@@ -40,6 +49,8 @@ class MainMenu(arcade.View):
         def on_click_play_button(event):
             """Use a click button to advance to the 'game' view."""
             game_view = Game(self.connection)
+            if game_view.recorder is not None:
+                game_view.recorder.setup(game_view)
             game_view.setup()
             self.window.show_view(game_view)
             self.manager.disable()
@@ -78,6 +89,7 @@ class MainMenu(arcade.View):
                                                                     ))
         self.scene.draw()
         self.manager.draw()
+        startup.mark("first frame drawn")
 
 
 class Game(arcade.View):
@@ -108,16 +120,21 @@ class Game(arcade.View):
         # Our TileMap Object
         self.tile_map = None
 
-        # Our Scene Object
+        # Our Scene Object, and its layers split into chunks so that only what is in view is drawn
         self.scene = None
+        self.scene_chunks = None
 
         # Create sprite lists here, and set them to None
         self.player_sprite = None
         self.npc_sprite = None
         self.frog = False
 
-        # Our 'physics' engine
+        # Our 'physics' engine, and the merged geometry of the platforms it collides with
         self.physics_engine = None
+        self.collision_layer = None
+
+        # Runs the physics at a fixed rate, whatever the frame rate
+        self.timestep = simulation.FixedTimestep()
 
         # A Camera that can be used for scrolling the screen
         self.camera = None
@@ -128,8 +145,16 @@ class Game(arcade.View):
         # Where is the right edge of the map?
         self.end_of_map = 0
 
-        # Connection to kivy interface
+        # Connection to kivy interface, messages are received in the background
         self.connection = connection
+        self.channel = protocol.Channel(connection)
+
+        # Worker processes running the code submitted through the kivy interface, started on the first submission :
+        # a game that never receives code (e.g. a replay) never starts them
+        self.sandbox = None
+        # Request id of the kivy interface for each sandbox job, and the output it printed that was already sent
+        self.submissions = {}
+        self.streamed = {}
 
         # Screen resolution
         self.screen_resolution = (SCREEN_WIDTH, SCREEN_HEIGHT)
@@ -138,14 +163,16 @@ class Game(arcade.View):
         self.tile_size = TILE_SIZE
 
         # Open save file
-        with open('save.json', 'r') as read_save_file:
-            self.save = json.loads(read_save_file.read())
+        self.save = utils.read_save()
 
         self.levels = {}
 
         # Level data, loaded later on
         self.level_data = None
 
+        # Load the characters textures once, for every reset and character switch
+        entities.preload_textures()
+
         # Load collisions with npc
         self.player_collision_list = None
 
@@ -153,6 +180,22 @@ class Game(arcade.View):
         self.fall_timer = 0.
         self.show_timer = False  # If true, prints the timer at every update, useful for setting up levels
 
+        # State of the level after its setup, restored when the user submits code
+        self.level_snapshot = None
+
+        # Blocks placed by the user code, not yet added to the platforms
+        self.pending_blocks = []
+
+        # Tiles covered by platforms, used by is_empty
+        self.occupancy = None
+
+        # Timings of the frames, only if profiling is enabled (F3 shows them, F4 saves them to a CSV file)
+        self.profiler = profiler.get_profiler()
+
+        # Log of the session, only if recording is enabled, and the log fed back to the game during a replay
+        self.recorder = replay.get_recorder()
+        self.replayer = None
+
     def setup(self):
         """ Set up the game here. Call this function to restart the game."""
 
@@ -164,28 +207,18 @@ class Game(arcade.View):
         self.show_textbox = False
 
         # Reset positions available to precomputed values
-        with open("levels.json", "r") as read_levels_file:
-            self.levels = json.loads(read_levels_file.read())
-
-        self.level_data = self.levels[self.save["current_level"]]
+        self.levels = level_cache.get_levels()
+        self.level_data = level_cache.get_level_data(self.save["current_level"])
         map_path = self.level_data["tilemap_path"]
 
-        # Save progress
-        utils.write_save(self)
-
-        # Initialize map
-
-        layer_options = {  # options specific to each layer
-            "Platforms": {
-                "use_spatial_hash": True,
-            },
-            "Background": {
-                "use_spatial_hash": True,
-            },
-        }
-        self.tile_map = arcade.load_tilemap(map_path, self.level_data["scaling"], layer_options)
-        if self.tile_map.background_color:
-            arcade.set_background_color(self.tile_map.background_color)
+        # Save progress, a replay leaves the save of the player untouched
+        if self.replayer is None:
+            utils.write_save(self)
+
+        # Initialize map, prefetched in the background if the previous setup had planned it
+        tile_map = level_cache.load_tilemap(map_path, self.level_data["scaling"], LAYER_OPTIONS)
+        if tile_map.background_color:
+            arcade.set_background_color(tile_map.background_color)
         else:
             arcade.set_background_color(arcade.color.BEAU_BLUE)
 
@@ -210,20 +243,15 @@ class Game(arcade.View):
                                                                      switch_menu_button])
         self.manager.add(gui.UIAnchorWidget(anchor_x="right", anchor_y="top", child=box))
 
-        # Initialize Scene
-        self.scene = arcade.Scene.from_tilemap(self.tile_map)
-
-        # End of map value
-        self.end_of_map = 1000
+        # Initialize Scene, player and physics engine, the same as the headless game
+        simulation.setup_level(self, tile_map)
 
-        # Initialize Player Sprite
-        self.can_move = True
-        self.player_sprite = entities.PlayerCharacter(self.frog)
-        self.player_sprite.scale = 1.2 * self.level_data["player_scaling"] * self.level_data["scaling"]
-        self.player_sprite.center_x = self.level_data["spawn_x"]
-        self.player_sprite.center_y = self.level_data["spawn_y"]
+        # The layers are only split into chunks if the camera can scroll, the whole level is in view otherwise
+        scrolling = self.end_of_map > self.camera.viewport_width
+        self.scene_chunks = chunks.ChunkedScene(self.scene, self.tile_map.sprite_lists if scrolling else [])
 
-        # Initialize NPCs of the level ; TODO currently only the last npc added to the json has the level textbox
+        # Initialize NPCs of the level, drawn behind the player ; TODO currently only the last npc added to the json
+        # has the level textbox
         if self.level_data["npc"]:
             for npc_index in range(len(self.level_data["npc"])):
                 npc_data = self.level_data["npc"][npc_index]
@@ -232,6 +260,7 @@ class Game(arcade.View):
                 npc_sprite.center_x = npc_data["x"]
                 npc_sprite.center_y = npc_data["y"]
                 self.scene.add_sprite(f"NPC {npc_index}", npc_sprite)
+                self.scene.move_sprite_list_before(f"NPC {npc_index}", "Player")
                 self.textbox_npc = npc_sprite
 
         # Initialize the TextBox of the level ; will be displayed when pressed enter next to an NPC
@@ -240,10 +269,6 @@ class Game(arcade.View):
             self.textbox = npc.TextBox(textbox_data["x"], textbox_data["y"], textbox_data["w"], textbox_data["h"],
                                        textbox_data["text"])
 
-
-        # Add player to the scene
-        self.scene.add_sprite("Player", self.player_sprite)
-
         # Blue tile showing the place_block() offset to the player
 
         if self.level_data["offset"] != -1:
@@ -254,9 +279,11 @@ class Game(arcade.View):
             offset_block.bottom = self.level_data["first_free_slots"][0] * TILE_SIZE * self.level_data["scaling"]
             self.scene.add_sprite("offset", offset_block)
 
-        # Create the physics engine
-        self.physics_engine = arcade.PhysicsEnginePlatformer(self.player_sprite, self.scene["Platforms"],
-                                                             gravity_constant=GRAVITY)
+        # Build the map of the next level while this level is played
+        next_level = self.save["current_level"] + 1
+        level_cache.prefetch_tilemaps([(self.levels[prefetched]["tilemap_path"], self.levels[prefetched]["scaling"],
+                                        LAYER_OPTIONS)
+                                       for prefetched in (next_level,) if prefetched < len(self.levels)])
 
     def on_show_view(self):
         self.manager.enable()
@@ -272,104 +299,146 @@ class Game(arcade.View):
         # Clear the screen to the background color
         self.clear()
 
-        # Activate the game camera
-        self.camera.use()
+        frame_profiler = self.profiler
+        if frame_profiler is not None:
+            start = frame_profiler.clock()
 
-        # Draw our Scene
+        # The player is drawn between its last two simulated positions, and followed by the game camera
+        player_position = self.timestep.interpolate(self.player_sprite)
+        self.center_camera_to_player()
+        self.camera.use()
 
-        self.scene.draw(pixelated=True)
-        self.manager.draw()
+        # Draw our Scene, only the chunks of the map in view
+        left = self.camera.position[0]
+        self.scene_chunks.draw(left, left + self.camera.viewport_width, pixelated=True)
+        self.player_sprite.position = player_position
+        if frame_profiler is not None:
+            start = frame_profiler.record("draw_scene", start)
 
         # Activate the GUI camera before drawing GUI elements
         self.gui_camera.use()
 
+        self.manager.draw()
+        if frame_profiler is not None:
+            start = frame_profiler.record("draw_gui", start)
+
         # Draw the NPC textbox
         if self.show_textbox:
             self.textbox.show()
 
+        if frame_profiler is not None:
+            frame_profiler.record("textbox", start)
+            frame_profiler.draw_overlay(self.scene, self.window.width, self.window.height)
+
         # Draw hit boxes.
         # self.player_sprite.draw_hit_box(arcade.color.BLUE, 3)
 
+        # The next maps are prefetched until the next frame
+        level_cache.resume_prefetch()
+
+    def center_camera_to_player(self):
+        """
+        Moves the game camera so that the player is at the center of the screen. The camera stays within the
+        playable part of the map, from its left edge to the end of the map, and never moves vertically.
+
+        Returns: None
+        """
+        screen_center_x = self.player_sprite.center_x - self.camera.viewport_width / 2
+        screen_center_x = max(0, min(screen_center_x, self.end_of_map - self.camera.viewport_width))
+        self.camera.move_to((screen_center_x, 0))
+
     def on_update(self, delta_time):
         """
         All the logic to move goes here.
         Normally, you'll call update() on the sprite lists that need it.
         """
-        # Move the player with the physics engine
-        self.physics_engine.update()
-        self.player_sprite.current_pos = (self.player_sprite.center_x, self.player_sprite.center_y)
-
-        # Update animations
-
-        # Check if the player is still jumping
-        if self.player_sprite.jumping:
-            if self.physics_engine.can_jump():
-                self.player_sprite.jumping = False
-                # Has he fallen for too long ?
-                # max_fall_time == -1 means the level has no fall damage
-                if self.level_data["max_fall_time"] != -1 and self.fall_timer >= self.level_data['max_fall_time']:
-                    self.setup()  # reset the level
-                self.fall_timer = 0
-            else:
-                self.fall_timer += delta_time
-
-        # Update the jumping state
-        self.player_sprite.jumping = not self.physics_engine.can_jump()
+        # The prefetch thread waits for the end of the frame
+        level_cache.pause_prefetch()
+
+        # The frames of a replay come from its log, those of a recorded session are logged
+        if self.replayer is not None:
+            delta_time = self.replayer.step(self)
+            if delta_time is None:
+                arcade.exit()
+                return
+        elif self.recorder is not None:
+            self.recorder.update(delta_time)
+
+        frame_profiler = self.profiler
+        if frame_profiler is not None:
+            frame_profiler.begin_frame()
+            start = frame_profiler.clock()
+
+        # Move the player and apply the level rules (fall damage, end of map, auto-jump), at a fixed rate
+        self.timestep.advance(self, delta_time)
+        if frame_profiler is not None:
+            start = frame_profiler.record("physics", start)
+
+        # Code submitted through the kivy interface ; the code is run by a sandbox worker, so that the game never
+        # waits for it
+        for message_type, request_id, payload in self.channel.receive():
+            if message_type == protocol.SUBMIT:
+                if self.sandbox is None:
+                    self.sandbox = sandbox.SandboxPool()
+                job_id = self.sandbox.submit(payload, self.save["current_level"], self.frog)
+                self.submissions[job_id] = request_id
+                if self.recorder is not None:
+                    self.recorder.submit(job_id, payload)
+                self.channel.send(protocol.ACCEPTED, request_id)
+        if frame_profiler is not None:
+            start = frame_profiler.record("pipe", start)
+
+        # Apply the code that has finished running to the level
+        if self.sandbox is not None and self.sandbox.busy():
+            for result in self.sandbox.poll(self.stream_output):
+                applied = result["reset"] and result["level"] == self.save["current_level"]
+                res = sandbox.apply_result(self, result)
+                error = res.startswith("/!\\")
+                if error:
+                    self.can_move = False
+                if self.recorder is not None:
+                    self.recorder.apply(result["id"], applied, error)
+                self.channel.send_output(self.submissions.pop(result["id"]), res, error,
+                                         self.streamed.pop(result["id"], ""))
+        if frame_profiler is not None:
+            start = frame_profiler.record("sandbox", start)
 
-        # If debug option enabled, show the jump timer in console
-        if self.show_timer:
-            print(self.fall_timer)
+        # Update the players animation
+        self.scene.update_animation(delta_time)
+        if frame_profiler is not None:
+            frame_profiler.record("animation", start)
 
-        # Did the player fall off the map?
-        if self.player_sprite.center_y < -100:
-            self.player_sprite.center_x = self.level_data["spawn_x"]
-            self.player_sprite.center_y = self.level_data["spawn_y"]
+    def stream_output(self, job_id, output):
+        """ Sends the output printed by a submission still running to the kivy interface. """
+        self.streamed[job_id] = self.streamed.get(job_id, "") + output
+        self.channel.send_partial_output(self.submissions[job_id], output)
 
-        # See if the user got to the end of the level
-        if self.player_sprite.center_x >= self.end_of_map:
-            # Advance to the next level
-            self.save["current_level"] += 1
+    def next_level(self):
+        """ Called when the player reaches the end of the map. """
+        # Advance to the next level
+        self.save["current_level"] += 1
 
-            # Save progress
+        # Save progress
+        if self.replayer is None:
             try:
-                utils.write_save(self)
+                utils.write_save(self, flush=True)
             except AttributeError:
                 # On first setup
                 pass
 
-            # Make sure to keep the score from this level when setting up the next level
-            self.reset_score = False
+        # Make sure to keep the score from this level when setting up the next level
+        self.reset_score = False
 
-            # Load the next level
-            self.setup()
-
-        # Trigger auto-jump if needed
-        if (self.player_sprite.walking_right or self.player_sprite.walking_left) \
-                and self.player_sprite.last_pos == self.player_sprite.current_pos:
-            self.player_sprite.change_y = self.level_data["player_jump_speed"]
-
-
-        try:
-            if self.connection.poll():
-                kivy_message = self.connection.recv()
-
-                # The self parameter allows us to have access to the game object inside the function user_instructions
-                res = code_input.user_instructions(self, kivy_message, [])
-                if res:
-                    self.connection.send(res)
-                    if res.startswith("/!\\"):  # error output :
-                        self.can_move = False
-        except EOFError as e:
-            print(e)
-            # save and quit
-
-        self.player_sprite.last_pos = self.player_sprite.current_pos
-
-        # Update the players animation
-        self.scene.update_animation(delta_time)
+        # Load the next level
+        self.setup()
 
     def on_key_press(self, key, modifiers):
         """ Called whenever a key is pressed."""
+        # During a replay, the keys only come from the log
+        if self.replayer is not None and not self.replayer.feeding:
+            return
+        if self.recorder is not None:
+            self.recorder.key(key, True)
 
         if key == arcade.key.ENTER:
             self.enter_pressed = True
@@ -383,11 +452,19 @@ class Game(arcade.View):
             self.right_pressed = True
         elif key == arcade.key.P:
             self.p_pressed = True
+        elif key == arcade.key.F3 and self.profiler is not None:
+            self.profiler.toggle_overlay()
+        elif key == arcade.key.F4 and self.profiler is not None:
+            self.profiler.dump_csv(profiler.CSV_PATH)
 
         self.process_keychange()
 
     def on_key_release(self, key, key_modifiers):
         """ Called whenever the user lets off a previously pressed key. """
+        if self.replayer is not None and not self.replayer.feeding:
+            return
+        if self.recorder is not None:
+            self.recorder.key(key, False)
 
         if key == arcade.key.ENTER:
             self.enter_pressed = False
@@ -440,7 +517,11 @@ class Game(arcade.View):
         """
 
     def on_click_reset(self, event):
-        self.setup()
+        # The level is rolled back from its snapshot, it is only set up again from its map if the snapshot is outdated
+        if self.recorder is not None:
+            self.recorder.reset()
+        self.show_textbox = False
+        reset_level(self)
 
     def on_click_help(self, event):
         help_view = HelpView(self)
@@ -452,5 +533,12 @@ class Game(arcade.View):
         self.window.show_view(menu_view)
 
     def save_and_quit(self):
-        utils.write_save(self)
+        if self.replayer is None:
+            utils.write_save(self, flush=True)
+        if self.sandbox is not None:
+            self.sandbox.close()
+        # The maps waiting to be prefetched are dropped, instead of being built before the game exits
+        level_cache.clear()
+        if self.recorder is not None:
+            self.recorder.close()
         self.on_close()
@@ -0,0 +1,176 @@
+import arcade
+
+import level_cache
+import simulation
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, TILE_SIZE, LAYER_OPTIONS
+
+# Fixed duration of a simulated tick, in seconds, the same as the game
+TICK = simulation.SIM_DT
+
+# Layers only read by the game, that the headless games of a process can share (see level_cache.load_shared_tilemap) ;
+# the blocks placed by the user code are added to the platforms, which each game builds for itself
+SHARED_LAYERS = ["Background", "Background_2", "BackgroundPlatforms"]
+
+
+class HeadlessGame:
+    """
+    Runs the logic of game.Game without any window : no rendering, no cameras and no UIManager.
+    The level is set up and the player is moved by the same code (see simulation.setup_level and update_player),
+    as fast as the CPU allows. It can be passed to code_input.user_instructions like a regular game.
+    """
+
+    def __init__(self, current_level=0, frog=False, advance_levels=False, share_layers=False):
+        """
+        Initializer for the headless game.
+
+        Args:
+            current_level: index of the level played, in levels.json
+            frog: True if the player plays the frog
+            advance_levels: if True, reaching the end of the map loads the next level like the real game does.
+                Otherwise the level is only marked as completed.
+            share_layers: if True, the layers only read by the game (SHARED_LAYERS) are shared with the other
+                headless games of the process sharing them, instead of being built for this game only
+        """
+        # Track the current state of what key is pressed
+        self.left_pressed = False
+        self.right_pressed = False
+
+        self.can_move = True
+
+        # Our TileMap and Scene Objects
+        self.tile_map = None
+        self.scene = None
+        # Nothing is drawn, the layers are not split into chunks (see game.Game.scene_chunks)
+        self.scene_chunks = None
+        self.share_layers = share_layers
+
+        self.player_sprite = None
+        self.frog = frog
+
+        # Our 'physics' engine, and the merged geometry of the platforms it collides with
+        self.physics_engine = None
+        self.collision_layer = None
+
+        # Where is the right edge of the map?
+        self.end_of_map = 0
+
+        # Screen resolution and default tile size, used by the user functions
+        self.screen_resolution = (SCREEN_WIDTH, SCREEN_HEIGHT)
+        self.tile_size = TILE_SIZE
+
+        # Progress is kept in memory only, the save file is never written
+        self.save = {"current_level": current_level}
+        self.advance_levels = advance_levels
+
+        self.levels = []
+        self.level_data = None
+
+        # Fall timer, used for fall damage
+        self.fall_timer = 0.
+        self.show_timer = False
+
+        # State of the level after its setup, restored when the user submits code
+        self.level_snapshot = None
+
+        # Blocks placed by the user code, not yet added to the platforms
+        self.pending_blocks = []
+
+        # Tiles covered by platforms, used by is_empty
+        self.occupancy = None
+
+        # Simulation statistics
+        self.completed = False
+        self.ticks = 0
+        self.resets = 0
+
+        # Steps of SIM_DT simulated from the frame times, like game.Game
+        self.timestep = simulation.FixedTimestep()
+
+    def setup(self):
+        """ Set up the level here. Call this function to restart the level."""
+        self.levels = level_cache.get_levels()
+        self.level_data = level_cache.get_level_data(self.save["current_level"])
+
+        # Without a window, sprite lists never create their OpenGL objects
+        if self.share_layers:
+            tile_map = level_cache.load_shared_tilemap(self.level_data["tilemap_path"], self.level_data["scaling"],
+                                                       LAYER_OPTIONS, SHARED_LAYERS)
+        else:
+            tile_map = level_cache.load_tilemap(self.level_data["tilemap_path"], self.level_data["scaling"],
+                                                LAYER_OPTIONS)
+        simulation.setup_level(self, tile_map)
+        self.resets += 1
+
+    def on_update(self, delta_time=TICK):
+        """ Simulates the steps covered by delta_time, through the same fixed timestep as game.Game. """
+        self.ticks += self.timestep.advance(self, delta_time)
+
+    def next_level(self):
+        """ Called when the player reaches the end of the map. """
+        self.completed = True
+
+        if self.advance_levels:
+            self.save["current_level"] += 1
+            self.setup()
+
+    def on_key_press(self, key, modifiers=0):
+        """ Called when a key is pressed, only the keys moving the player are handled. """
+        if key == arcade.key.LEFT or key == arcade.key.A:
+            self.left_pressed = True
+        elif key == arcade.key.RIGHT or key == arcade.key.D:
+            self.right_pressed = True
+
+        self.process_keychange()
+
+    def on_key_release(self, key, modifiers=0):
+        """ Called when a key is released, only the keys moving the player are handled. """
+        if key == arcade.key.LEFT or key == arcade.key.A:
+            self.left_pressed = False
+        elif key == arcade.key.RIGHT or key == arcade.key.D:
+            self.right_pressed = False
+
+        self.process_keychange()
+
+    def process_keychange(self):
+        """ Moves the player according to the pressed keys, like game.Game does. """
+        if self.can_move:
+            if self.left_pressed and not self.right_pressed:
+                self.player_sprite.change_x = (-self.level_data["player_movement_speed"] * self.level_data["scaling"])
+                self.player_sprite.walking_right = True
+            elif self.right_pressed and not self.left_pressed:
+                self.player_sprite.change_x = (self.level_data["player_movement_speed"] * self.level_data["scaling"])
+                self.player_sprite.walking_right = True
+            else:
+                self.player_sprite.change_x = 0
+                self.player_sprite.walking_right = False
+                self.player_sprite.walking_left = False
+
+    def walk_to_end(self, max_time=60., delta_time=TICK):
+        """
+        Holds the right key until the player reaches the end of the map, or until max_time simulated seconds.
+        The key is pressed again after each reset of the level (fall damage), as a player would do.
+
+        Args:
+            max_time: maximum simulated time, in seconds
+            delta_time: duration of a tick, in seconds
+
+        Returns: True if the level was completed
+        """
+        self.completed = False
+        self.right_pressed = True
+        self.left_pressed = False
+
+        player_sprite = None
+        for _ in range(int(max_time / delta_time)):
+            if self.player_sprite is not player_sprite:
+                # First tick, or the level has been reset
+                player_sprite = self.player_sprite
+                self.process_keychange()
+
+            self.on_update(delta_time)
+            if self.completed:
+                break
+
+        self.right_pressed = False
+        return self.completed
@@ -0,0 +1,366 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import arcade
+import pytiled_parser
+
+import levelpack
+from occupancy import OccupancyGrid
+
+# Maximum number of parsed files kept in memory
+MAX_CACHED_LEVEL_FILES = 4
+MAX_CACHED_TILEMAPS = 8
+
+_levels_files = OrderedDict()
+_tiled_maps = OrderedDict()
+# Sprite lists of the shared layers of the tile maps, see load_shared_tilemap
+_shared_layers = OrderedDict()
+
+# The caches are shared with the thread building the prefetched tile maps
+_lock = threading.RLock()
+
+# Tile maps built in the background (futures), by arguments of load_tilemap, see prefetch_tilemaps
+_prefetched_tilemaps = {}
+_prefetch_executor = None
+# Arguments of the last call of load_tilemap, its map is not prefetched again
+_loaded_tilemap_key = None
+
+# Cleared while the game computes a frame, the prefetch thread only builds the maps between the frames
+_prefetch_gate = threading.Event()
+_prefetch_gate.set()
+
+
+def _cached(cache, path, load, max_size):
+    """
+    Returns the cached value of a file, loading it if the file is not cached or was modified since.
+    The least recently used entries are evicted once the cache holds more than max_size files.
+
+    Args:
+        cache: OrderedDict used as cache, keyed by absolute path
+        path: path of the file
+        load: function loading the file, called with the path
+        max_size: maximum number of files kept in the cache
+
+    Returns: the loaded value
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+
+    with _lock:
+        if path in cache and cache[path][0] == mtime:
+            cache.move_to_end(path)
+            return cache[path][1]
+
+        value = load(path)
+        cache[path] = (mtime, value)
+        cache.move_to_end(path)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+        return value
+
+
+def _load_json(path):
+    """ Loads a json file. """
+    with open(path, "r") as read_file:
+        return json.loads(read_file.read())
+
+
+def get_levels(levels_path="levels.json"):
+    """
+    Returns the list of all levels definitions, parsed once per modification of the file.
+    The list is shared, it must not be modified : use get_level_data to get a level that can be modified.
+
+    Args:
+        levels_path: path of the levels file
+
+    Returns: list of the levels data (dict)
+    """
+    return _cached(_levels_files, levels_path, _load_json, MAX_CACHED_LEVEL_FILES)
+
+
+def get_level_data(level, levels_path="levels.json"):
+    """
+    Returns a copy of the definition of a level, that can be modified by the game (e.g. first_free_slots).
+    The level is decoded from the level pack if it is up to date, the levels file is not read then.
+
+    Args:
+        level: index of the level in the levels file
+        levels_path: path of the levels file
+
+    Returns: dict, level data
+    """
+    pack = levelpack.get_pack(levels_path)
+    if pack is not None and pack.is_fresh(level):
+        return pack.level_data(level)
+    return copy.deepcopy(get_levels(levels_path)[level])
+
+
+def get_tiled_map(map_path):
+    """
+    Returns the parsed TMX file, parsed once per modification of the file.
+    The parsed file is decoded from the level pack if it is up to date, instead of parsing the XML.
+
+    Args:
+        map_path: path of the TMX file
+
+    Returns: pytiled_parser.TiledMap
+    """
+    return _cached(_tiled_maps, map_path, lambda path: _parse_map(map_path), MAX_CACHED_TILEMAPS)
+
+
+def _parse_map(map_path):
+    """ Parses a TMX file, or decodes it from the level pack. """
+    pack = levelpack.get_pack()
+    if pack is not None:
+        level = pack.maps.get(os.path.normpath(map_path))
+        if level is not None and pack.is_fresh(level):
+            return pack.tiled_map(level)
+    return pytiled_parser.parse_map(Path(map_path))
+
+
+class LazyTileMap(arcade.TileMap):
+    """
+    TileMap whose sprite lists are lazy : they are filled without OpenGL, so the map can be built by another thread
+    than the one of the window. Only tile layers are supported.
+    Its build stops between two tiles while the prefetch is paused (see pause_prefetch), it is only built by the
+    prefetch thread.
+    """
+
+    def _process_tile_layer(self, layer, scaling=1.0, use_spatial_hash=None, hit_box_algorithm="Simple",
+                            hit_box_detail=4.5, offset=(0, 0), custom_class=None, custom_class_args=None):
+        """ Same as arcade.TileMap._process_tile_layer, with a lazy sprite list. """
+        sprite_list = arcade.SpriteList(use_spatial_hash=use_spatial_hash, lazy=True)
+
+        tile_width = self.tiled_map.tile_size[0] * scaling
+        tile_height = self.tiled_map.tile_size[1] * scaling
+        for row_index, row in enumerate(layer.data):
+            for column_index, item in enumerate(row):
+                # Check for an empty tile
+                if item == 0:
+                    continue
+
+                _prefetch_gate.wait()
+                tile = self._get_tile_by_gid(item)
+                if tile is None:
+                    raise ValueError(f"Couldn't find tile for item {item} in layer '{layer.name}' in file "
+                                     f"'{self.tiled_map.map_file}' at ({column_index}, {row_index}).")
+
+                sprite = self._create_sprite_from_tile(tile, scaling=scaling, hit_box_algorithm=hit_box_algorithm,
+                                                       hit_box_detail=hit_box_detail, custom_class=custom_class,
+                                                       custom_class_args=custom_class_args or {})
+                if sprite is None:
+                    print(f"Warning: Could not create sprite number {item} in layer '{layer.name}' {tile.image}")
+                else:
+                    sprite.center_x = column_index * tile_width + sprite.width / 2 + offset[0]
+                    sprite.center_y = (self.tiled_map.map_size.height - row_index - 1) * tile_height \
+                        + sprite.height / 2 + offset[1]
+                    if layer.tint_color:
+                        sprite.color = layer.tint_color
+                    if layer.opacity:
+                        sprite.alpha = int(layer.opacity * 255)
+                    sprite_list.visible = layer.visible
+                    sprite_list.append(sprite)
+
+                if layer.properties:
+                    sprite_list.properties = layer.properties
+
+        return sprite_list
+
+
+def _tilemap_key(map_path, scaling, layer_options):
+    """ Returns the key of the arguments of load_tilemap. """
+    return os.path.abspath(map_path), scaling, json.dumps(layer_options, sort_keys=True)
+
+
+def _build_lazy_tilemap(map_path, scaling, layer_options):
+    """
+    Builds a tile map with lazy sprite lists, run by the prefetch thread.
+
+    Returns: LazyTileMap, or None if the map has other layers than tile layers
+    """
+    tiled_map = get_tiled_map(map_path)
+    if not all(isinstance(layer, pytiled_parser.TileLayer) for layer in tiled_map.layers):
+        return None
+    return LazyTileMap(scaling=scaling, layer_options=layer_options, tiled_map=tiled_map)
+
+
+def prefetch_tilemaps(maps):
+    """
+    Builds tile maps in a background thread, so that the next calls of load_tilemap with the same arguments only
+    have to take them. The maps prefetched before and missing from the list are dropped, the map loaded last and
+    the maps already queued are skipped.
+
+    Args:
+        maps: list of (map_path, scaling, layer_options) tuples, the arguments of load_tilemap
+
+    Returns: None
+    """
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    keys = set()
+    for map_path, scaling, layer_options in maps:
+        key = _tilemap_key(map_path, scaling, layer_options)
+        if key == _loaded_tilemap_key:
+            continue
+        keys.add(key)
+        if key not in _prefetched_tilemaps:
+            _prefetched_tilemaps[key] = _prefetch_executor.submit(_build_lazy_tilemap, map_path, scaling,
+                                                                  layer_options)
+
+    for key in list(_prefetched_tilemaps):
+        if key not in keys:
+            _prefetched_tilemaps.pop(key).cancel()
+
+
+def pause_prefetch():
+    """
+    Pauses the prefetch thread until resume_prefetch is called. The game pauses it during its frames, which would
+    be slowed down by the thread otherwise (both need the GIL).
+
+    Returns: None
+    """
+    _prefetch_gate.clear()
+
+
+def resume_prefetch():
+    """ Lets the prefetch thread build the maps again. """
+    _prefetch_gate.set()
+
+
+def _take_prefetched_tilemap(map_path, scaling, layer_options):
+    """
+    Takes the prefetched tile map built with the same arguments, waiting for it if it is being built.
+    The sprite lists of the map are initialized, which needs the window.
+
+    Returns: LazyTileMap, or None if there is none ready (not prefetched, not started, failed or outdated)
+    """
+    future = _prefetched_tilemaps.pop(_tilemap_key(map_path, scaling, layer_options), None)
+    # A map whose build has not started is built right away instead
+    if future is None or future.cancel():
+        return None
+
+    resume_prefetch()
+    try:
+        tile_map = future.result()
+    except Exception:
+        return None
+    if tile_map is None or tile_map.tiled_map is not get_tiled_map(map_path):
+        return None
+
+    # The sprites can only be removed from a lazy sprite list once it is initialized
+    for sprite_list in tile_map.sprite_lists.values():
+        sprite_list.initialize()
+    return tile_map
+
+
+def load_tilemap(map_path, scaling=1.0, layer_options=None):
+    """
+    Same as arcade.load_tilemap, but the TMX file is only parsed once per modification.
+    A new TileMap (with new sprite lists) is built at each call, so the sprites can be modified by the game, unless
+    it was already built in the background (see prefetch_tilemaps).
+
+    Args:
+        map_path: path of the TMX file
+        scaling: scaling of the tiles
+        layer_options: options specific to each layer, see arcade.load_tilemap
+
+    Returns: arcade.TileMap
+    """
+    global _loaded_tilemap_key
+    _loaded_tilemap_key = _tilemap_key(map_path, scaling, layer_options)
+
+    tile_map = _take_prefetched_tilemap(map_path, scaling, layer_options)
+    if tile_map is not None:
+        return tile_map
+    return arcade.TileMap(scaling=scaling, layer_options=layer_options, tiled_map=get_tiled_map(map_path))
+
+
+def _build_layers(tiled_map, scaling, layer_options, layer_names, shared):
+    """
+    Builds a tile map of some layers of a parsed map only.
+
+    Args:
+        tiled_map: pytiled_parser.TiledMap
+        scaling: scaling of the tiles
+        layer_options: options specific to each layer, see arcade.load_tilemap
+        layer_names: names of the layers
+        shared: True to build the layers listed, False to build the other ones
+
+    Returns: arcade.TileMap
+    """
+    partial_map = copy.copy(tiled_map)
+    partial_map.layers = [layer for layer in tiled_map.layers if (layer.name in layer_names) == shared]
+    return arcade.TileMap(scaling=scaling, layer_options=layer_options, tiled_map=partial_map)
+
+
+def load_shared_tilemap(map_path, scaling=1.0, layer_options=None, shared_layers=()):
+    """
+    Same as load_tilemap, but the sprite lists of the shared layers are only built once per modification of the file,
+    and shared by all the maps loaded with the same arguments. Only the other layers are built at each call.
+    Many headless games of the same level then cost the memory of their modified layers only : the shared sprite
+    lists must never be modified (no sprite added, removed or moved).
+
+    Args:
+        map_path: path of the TMX file
+        scaling: scaling of the tiles
+        layer_options: options specific to each layer, see arcade.load_tilemap
+        shared_layers: names of the layers shared
+
+    Returns: arcade.TileMap, its sprite lists in the order of the layers of the file
+    """
+    tiled_map = get_tiled_map(map_path)
+    tile_map = _build_layers(tiled_map, scaling, layer_options, shared_layers, False)
+
+    with _lock:
+        # Emptied when the file is modified, like the parsed maps
+        shared_maps = _cached(_shared_layers, map_path, lambda path: {}, MAX_CACHED_TILEMAPS)
+        key = _tilemap_key(map_path, scaling, layer_options) + (tuple(sorted(shared_layers)),)
+        if key not in shared_maps or shared_maps[key][0] is not tiled_map:
+            shared_maps[key] = (tiled_map,
+                                _build_layers(tiled_map, scaling, layer_options, shared_layers, True).sprite_lists)
+        shared_lists = shared_maps[key][1]
+
+    tile_map.sprite_lists = {layer.name: tile_map.sprite_lists.get(layer.name, shared_lists.get(layer.name))
+                             for layer in tiled_map.layers
+                             if layer.name in tile_map.sprite_lists or layer.name in shared_lists}
+    tile_map.tiled_map = tiled_map
+    return tile_map
+
+
+def get_occupancy(level, tile_map, sprite_lists, tile_size):
+    """
+    Returns the occupancy grid of the tiles of a level, decoded from the level pack if it is up to date,
+    or built from the sprites otherwise.
+
+    Args:
+        level: index of the level in the levels file
+        tile_map: arcade.TileMap of the level
+        sprite_lists: sprite lists of the platforms (Platforms and BackgroundPlatforms layers)
+        tile_size: size of one tile in pixels, adapted to the level scaling
+
+    Returns: OccupancyGrid
+    """
+    pack = levelpack.get_pack()
+    if pack is not None and pack.is_fresh(level):
+        grid = pack.occupancy(level)
+        if (grid.tile_size, grid.columns, grid.rows) == (tile_size, tile_map.width, tile_map.height):
+            return grid
+    return OccupancyGrid.from_sprite_lists(tile_size, tile_map.width, tile_map.height, sprite_lists)
+
+
+def clear():
+    """ Empties the caches, and drops the prefetched tile maps. """
+    with _lock:
+        _levels_files.clear()
+        _tiled_maps.clear()
+        _shared_layers.clear()
+    for future in _prefetched_tilemaps.values():
+        future.cancel()
+    _prefetched_tilemaps.clear()
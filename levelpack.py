@@ -0,0 +1,281 @@
+import argparse
+import json
+import mmap
+import os
+import pickle
+import re
+import struct
+from array import array
+from pathlib import Path
+
+import arcade
+import pytiled_parser
+
+from constants import TILE_SIZE
+from occupancy import OccupancyGrid
+
+# Default path of the pack, built from levels.json and the TMX files
+PACK_PATH = "levels.pack"
+
+# Start of a pack : magic number, then the length of the index
+MAGIC = b"LVLPACK1"
+HEADER = struct.Struct(">8sI")
+
+# Layers whose tiles make the occupancy grid of a level (see game.Game.setup)
+OCCUPANCY_LAYERS = ("Platforms", "BackgroundPlatforms")
+
+_packs = {}
+
+
+def source_state(path):
+    """
+    Returns what identifies a version of a source file.
+
+    Args:
+        path: path of the file
+
+    Returns: list [modification time in ns, size]
+    """
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def tileset_paths(map_path):
+    """
+    Lists the external tilesets a TMX file refers to.
+
+    Args:
+        map_path: path of the TMX file
+
+    Returns: list of paths
+    """
+    with open(map_path, "r") as map_file:
+        sources = re.findall(r'<tileset[^>]*source="([^"]+)"', map_file.read())
+    return [os.path.normpath(os.path.join(os.path.dirname(map_path), source)) for source in sources]
+
+
+def image_paths(tiled_map):
+    """
+    Lists the images of the tiles of a parsed TMX file, from which the hit boxes of the occupancy grid are computed.
+
+    Args:
+        tiled_map: pytiled_parser.TiledMap
+
+    Returns: sorted list of paths, relative to the current directory
+    """
+    images = set()
+    for tileset in tiled_map.tilesets.values():
+        if tileset.image is not None:
+            images.add(tileset.image)
+        for tile in (tileset.tiles or {}).values():
+            if tile.image is not None:
+                images.add(tile.image)
+    return sorted(os.path.normpath(os.path.relpath(image)) for image in images)
+
+
+def build_pack(levels_path="levels.json", pack_path=PACK_PATH):
+    """
+    Compiles the levels into a pack : for each level, its data, its parsed TMX file and its occupancy grid.
+    The sources (levels file, TMX and TSX files, images of the tiles) stay the reference : a level is read from the
+    pack only as long as they have not changed since the build.
+
+    Args:
+        levels_path: path of the levels file
+        pack_path: path of the pack written
+
+    Returns: number of levels packed
+    """
+    with open(levels_path, "r") as read_levels_file:
+        levels = json.loads(read_levels_file.read())
+
+    blobs = []
+    offset = 0
+
+    def add_blob(blob):
+        nonlocal offset
+        blobs.append(blob)
+        offset += len(blob)
+        return [offset - len(blob), len(blob)]
+
+    index = {
+        "pytiled_parser": pytiled_parser.__version__,
+        "arcade": arcade.__version__,
+        "levels_path": levels_path,
+        "levels_source": source_state(levels_path),
+        "levels": [],
+    }
+    for level_data in levels:
+        map_path = level_data["tilemap_path"]
+        tiled_map = pytiled_parser.parse_map(Path(map_path))
+
+        # Occupancy grid of the tiles of the level, built like the game does
+        tile_map = arcade.TileMap(scaling=level_data["scaling"], tiled_map=tiled_map)
+        grid = OccupancyGrid.from_sprite_lists(TILE_SIZE * level_data["scaling"], tile_map.width, tile_map.height,
+                                               [tile_map.sprite_lists[layer] for layer in OCCUPANCY_LAYERS
+                                                if layer in tile_map.sprite_lists])
+
+        index["levels"].append({
+            "tilemap_path": map_path,
+            "sources": {path: source_state(path)
+                        for path in [map_path] + tileset_paths(map_path) + image_paths(tiled_map)},
+            "tile_size": grid.tile_size,
+            "columns": grid.columns,
+            "rows": grid.rows,
+            "outside_cells": [[column, row, count] for (column, row), count in grid.outside_cells.items()],
+            "sections": {
+                "level": add_blob(json.dumps(level_data).encode("utf-8")),
+                "tiled_map": add_blob(pickle.dumps(tiled_map, protocol=pickle.HIGHEST_PROTOCOL)),
+                "occupancy": add_blob(grid.cells.tobytes()),
+            },
+        })
+
+    index_data = json.dumps(index).encode("utf-8")
+    temp_path = pack_path + ".tmp"
+    with open(temp_path, "wb") as pack_file:
+        pack_file.write(HEADER.pack(MAGIC, len(index_data)))
+        pack_file.write(index_data)
+        for blob in blobs:
+            pack_file.write(blob)
+    os.replace(temp_path, pack_path)
+    return len(levels)
+
+
+class LevelPack:
+    """
+    Pack of compiled levels, memory-mapped : only the sections of the levels played are read and decoded.
+    """
+
+    def __init__(self, pack_path=PACK_PATH):
+        """
+        Opens a pack and reads its index.
+
+        Args:
+            pack_path: path of the pack
+
+        Raises: ValueError if the file is not a pack.
+        """
+        with open(pack_path, "rb") as pack_file:
+            self.data = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"{pack_path} is not a level pack.")
+        self.index = json.loads(self.data[HEADER.size:HEADER.size + index_length].decode("utf-8"))
+        self.data_start = HEADER.size + index_length
+
+        # Level of each TMX file
+        self.maps = {os.path.normpath(level["tilemap_path"]): level_index
+                     for level_index, level in enumerate(self.index["levels"])}
+
+    def is_compatible(self, levels_path):
+        """
+        Checks if the pack was built from a levels file, with the installed versions of the parsers.
+
+        Args:
+            levels_path: path of the levels file
+
+        Returns: bool
+        """
+        return os.path.normpath(self.index["levels_path"]) == os.path.normpath(levels_path) \
+            and self.index["pytiled_parser"] == pytiled_parser.__version__ \
+            and self.index["arcade"] == arcade.__version__
+
+    def is_fresh(self, level):
+        """
+        Checks if the sources of a level have not changed since the pack was built.
+
+        Args:
+            level: index of the level
+
+        Returns: bool
+        """
+        try:
+            if source_state(self.index["levels_path"]) != self.index["levels_source"]:
+                return False
+            return all(source_state(path) == state for path, state in self.index["levels"][level]["sources"].items())
+        except (OSError, IndexError):
+            return False
+
+    def section(self, level, name):
+        """ Returns the bytes of a section of a level. """
+        start, length = self.index["levels"][level]["sections"][name]
+        return self.data[self.data_start + start:self.data_start + start + length]
+
+    def level_data(self, level):
+        """
+        Decodes the data of a level, as in levels.json.
+
+        Args:
+            level: index of the level
+
+        Returns: dict, a new one at each call
+        """
+        return json.loads(self.section(level, "level").decode("utf-8"))
+
+    def tiled_map(self, level):
+        """
+        Decodes the parsed TMX file of a level.
+
+        Args:
+            level: index of the level
+
+        Returns: pytiled_parser.TiledMap
+        """
+        return pickle.loads(self.section(level, "tiled_map"))
+
+    def occupancy(self, level):
+        """
+        Decodes the occupancy grid of the tiles of a level.
+
+        Args:
+            level: index of the level
+
+        Returns: OccupancyGrid, a new one at each call
+        """
+        level_index = self.index["levels"][level]
+        grid = OccupancyGrid(level_index["tile_size"], level_index["columns"], level_index["rows"])
+        grid.cells = array("H", self.section(level, "occupancy"))
+        grid.outside_cells = {(column, row): count for column, row, count in level_index["outside_cells"]}
+        return grid
+
+
+def get_pack(levels_path="levels.json", pack_path=PACK_PATH):
+    """
+    Returns the pack built from a levels file, opened once per build of the pack.
+
+    Args:
+        levels_path: path of the levels file the pack must have been built from
+        pack_path: path of the pack
+
+    Returns: LevelPack, or None if there is no usable pack
+    """
+    try:
+        state = source_state(pack_path)
+    except OSError:
+        return None
+
+    if pack_path not in _packs or _packs[pack_path][0] != state:
+        try:
+            _packs[pack_path] = (state, LevelPack(pack_path))
+        except (OSError, ValueError, struct.error):
+            _packs[pack_path] = (state, None)
+
+    pack = _packs[pack_path][1]
+    if pack is None or not pack.is_compatible(levels_path):
+        return None
+    return pack
+
+
+def main():
+    """ Builds the level pack. """
+    parser = argparse.ArgumentParser(description="Compiles the levels and their TMX files into a level pack.")
+    parser.add_argument("-l", "--levels", default="levels.json", help="path of the levels file")
+    parser.add_argument("-o", "--output", default=PACK_PATH, help=f"path of the pack (default: {PACK_PATH})")
+    args = parser.parse_args()
+
+    levels_count = build_pack(args.levels, args.output)
+    print(f"{levels_count} levels packed in {args.output} ({os.path.getsize(args.output) // 1024} KB)")
+
+
+if __name__ == "__main__":
+    main()
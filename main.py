@@ -1,16 +1,30 @@
 import multiprocessing
-from game import SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE
+
+import startup
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE
 
 
 def run_arcade(arcade_connection):
+    startup.mark("arcade process started")
+
+    # The fork server of the sandbox, if enabled, imports the game API while the game starts
+    import sandbox
+    sandbox.preload()
+
     import arcade
     from game import MainMenu
+    startup.mark("game imported")
 
     window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    startup.mark("window open")
     menu_view = MainMenu(arcade_connection)
     window.show_view(menu_view)
     arcade.run()
 
+    # The process exits without running the atexit handlers, the queued save is written now
+    import utils
+    utils.flush_save()
+
     """
     from game import Game
     game_instance = Game(arcade_connection)
@@ -19,22 +33,28 @@ def run_arcade(arcade_connection):
     """
 
 def run_kivy(kivy_connection):
+    startup.mark("kivy process started")
     from uix import Input
+    startup.mark("kivy imported")
     input_window = Input(kivy_connection)
     input_window.run()
 
 
 def main():
     """ Main method """
+    # The processes trace their startup from here, if GAME_STARTUP_TRACE is set
+    startup.set_launch_time()
+
     # Initialize connection between Arcade and Kivy through a (duplex) pipe
     arcade_connection, kivy_connection = multiprocessing.Pipe(duplex=True)
 
-    # Initialize and start arcade and kivy processes
-    arcade_process = multiprocessing.Process(target=run_arcade, args=[arcade_connection])
+    # Initialize and start arcade and kivy processes, each one only imports its own toolkit
+    arcade_process = multiprocessing.Process(target=run_arcade, args=[arcade_connection], name="arcade")
     arcade_process.start()
 
-    kivy_process = multiprocessing.Process(target=run_kivy, args=[kivy_connection])
+    kivy_process = multiprocessing.Process(target=run_kivy, args=[kivy_connection], name="kivy")
     kivy_process.start()
+    startup.mark("processes started")
 
 
 if __name__ == "__main__":
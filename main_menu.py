@@ -2,6 +2,14 @@ import arcade
 import arcade.gui as gui
 from utils import write_save
 
+from text_batch import TextBatch
+
+# Fonts of the hint book, the first one available is used
+BOOK_FONT = ("Times New Roman",  # Comes with Windows
+             "Times",  # MacOS may sometimes have this variant
+             "Liberation Serif"  # Common on Linux systems
+             )
+
 
 class MenuView(arcade.View):
     """Main menu view class."""
@@ -26,7 +34,9 @@ class MenuView(arcade.View):
         @exit_button.event("on_click")
         def on_click_exit_button(event):
             arcade.exit()
-            write_save(self.game_view)
+            write_save(self.game_view, flush=True)
+            if self.game_view.recorder is not None:
+                self.game_view.recorder.close()
 
         @resume_button.event("on_click")
         def on_click_resume_button(event):
@@ -36,8 +46,10 @@ class MenuView(arcade.View):
         @restart_button.event("on_click")
         def on_click_restart_button(event):
             self.game_view.save["current_level"] = 0
-            write_save(self.game_view)
+            write_save(self.game_view, flush=True)
             self.game_view.frog = False
+            if self.game_view.recorder is not None:
+                self.game_view.recorder.setup(self.game_view)
             self.game_view.setup()
             self.window.show_view(self.game_view)
 
@@ -61,6 +73,11 @@ class MenuView(arcade.View):
 
 class HelpView(arcade.View):
     """Main menu view class."""
+
+    # Text of the book, laid out on the first draw and shared by the views, and the hints it was laid out with
+    text_batch = None
+    hints = None
+
     def __init__(self, game_view):
         super().__init__()
         self.manager = gui.UIManager()
@@ -80,7 +97,6 @@ class HelpView(arcade.View):
         self.book.center_y = 250
         self.scene.add_sprite("Book", self.book)
 
-
         @retour_button.event("on_click")
         def on_click_retour_button(event):
             self.window.show_view(self.game_view)
@@ -102,62 +118,41 @@ class HelpView(arcade.View):
         self.clear()
         self.scene.draw(pixelated=True)
         self.manager.draw()
-        i = 0
-        # Print the description of the is_empty function in the hint book
-        arcade.draw_text("    - place_block(x)    ", 550, 300 - i, arcade.color.BLACK, 12,
-                         width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top", bold=True,
-                         font_name=("Times New Roman",  # Comes with Windows
-                                    "Times",  # MacOS may sometimes have this variant
-                                    "Liberation Serif"  # Common on Linux systems)
-                                    ))
-        i += 15
-        self.foncts = "\nPlaces a block in the column x on the screen." \
-                      "\nThe blocks can be stacked." \
-                      "\n(index 0 is signified by a special block). " \
-
-
-        liste_ligne = self.foncts.splitlines()
-        for ligne in liste_ligne:
-            arcade.draw_text(ligne, 550, 300 - i, arcade.color.BLACK, 10,
-                             width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top",
-                             font_name=("Times New Roman",  # Comes with Windows
-                                        "Times",  # MacOS may sometimes have this variant
-                                        "Liberation Serif"  # Common on Linux systems)
-                                        ))
-            i += 15
-        i += 30
+
+        # The text of the book is laid out again only when the hints change (new level)
+        if HelpView.text_batch is None or HelpView.hints != self.game_view.level_data["hints"]:
+            HelpView.hints = self.game_view.level_data["hints"]
+            HelpView.text_batch = self.create_text_batch(HelpView.hints)
+        HelpView.text_batch.draw()
+
+    @staticmethod
+    def create_text_batch(hints):
+        """
+        Lays out the text of the hint book.
+
+        Args:
+            hints: list of the hints of the level
+
+        Returns: TextBatch
+        """
+        text_batch = TextBatch()
+
+        # Print the description of the place_block function in the hint book
+        text_batch.add("    - place_block(x)    ", 550, 300, font_size=12, bold=True, font_name=BOOK_FONT)
+        foncts = "\nPlaces a block in the column x on the screen." \
+                 "\nThe blocks can be stacked." \
+                 "\n(index 0 is signified by a special block). "
+        y = text_batch.add_lines(foncts, 550, 285, 15, font_size=10, font_name=BOOK_FONT)
+
         # Print the description of the is_empty function in the hint book
-        arcade.draw_text("    - is_empty(x,y)    ", 550, 300 - i, arcade.color.BLACK, 12,
-                         width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top", bold=True,
-                         font_name=("Times New Roman",  # Comes with Windows
-                                    "Times",  # MacOS may sometimes have this variant
-                                    "Liberation Serif"  # Common on Linux systems)
-                                    ))
-        i += 15
-        self.foncts = "\nReturns True if no prior block exists " \
-                      "\nat the (x,y) coordinates, " \
-                      "\nreturns False if it isn’t the case."\
-
-        liste_ligne = self.foncts.splitlines()
-        for ligne in liste_ligne:
-            arcade.draw_text(ligne, 550, 300 - i, arcade.color.BLACK, 10,
-                             width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top",
-                             font_name=("Times New Roman",  # Comes with Windows
-                                        "Times",  # MacOS may sometimes have this variant
-                                        "Liberation Serif"  # Common on Linux systems)
-                                        ))
-            i += 15
+        text_batch.add("    - is_empty(x,y)    ", 550, y - 30, font_size=12, bold=True, font_name=BOOK_FONT)
+        foncts = "\nReturns True if no prior block exists " \
+                 "\nat the (x,y) coordinates, " \
+                 "\nreturns False if it isn’t the case."
+        text_batch.add_lines(foncts, 550, y - 45, 15, font_size=10, font_name=BOOK_FONT)
 
         # Print the text of the python loops in the hint book
-        i = 0
-        arcade.draw_text("Python loops :  \n ", 280, 477 - i, arcade.color.BLACK, 12,
-                         width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top", bold=True,
-                         font_name=("Times New Roman",  # Comes with Windows
-                                    "Times",  # MacOS may sometimes have this variant
-                                    "Liberation Serif"  # Common on Linux systems)
-                                    ))
-        i += 30
-
+        text_batch.add("Python loops :  ", 280, 477, font_size=12, bold=True, font_name=BOOK_FONT)
         foncts = "  For i in range (X):"\
                  "\n\n“For” loops are used to repeat a sequence of " \
                  "\ninstructions x times." \
@@ -168,28 +163,11 @@ class HelpView(arcade.View):
                  "\n\n\n\n  While (condition) : "\
                  "\n\n”While” loops are executed a certain amount " \
                  "\nof times as long as the given condition is valid."
+        text_batch.add_lines(foncts, 200, 450, 15, font_size=11, font_name=BOOK_FONT)
+
+        # Print the hints of the level
+        text_batch.add("Hints of the level", 620, 477, font_size=12, bold=True, font_name=BOOK_FONT)
+        for i, hint in enumerate(hints):
+            text_batch.add(hint, 545, 445 - 15 * i, font_size=10, font_name=BOOK_FONT)
 
-        liste_ligne = foncts.splitlines()
-        for ligne in liste_ligne:
-            arcade.draw_text(ligne, 200, 480-i, arcade.color.BLACK, 11,
-                             width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top",
-                             font_name=("Times New Roman",  # Comes with Windows
-                                        "Times",  # MacOS may sometimes have this variant
-                                        "Liberation Serif"  # Common on Linux systems)
-                                        ))
-            i += 15
-        i = 0
-        arcade.draw_text("Hints of the level", 620, 477 - i, arcade.color.BLACK, 12,
-                         width=int(1000 - 20), bold=True, align="left", anchor_x="left", anchor_y="top",
-                         font_name=("Times New Roman",  # Comes with Windows
-                                    "Times",  # MacOS may sometimes have this variant
-                                    "Liberation Serif"  # Common on Linux systems)
-                                    ))
-        for hint in self.game_view.level_data["hints"]:
-            arcade.draw_text(hint, 545, 445 - i, arcade.color.BLACK, 10,
-                             width=int(1000 - 20), align="left", anchor_x="left", anchor_y="top",
-                             font_name=("Times New Roman",  # Comes with Windows
-                                        "Times",  # MacOS may sometimes have this variant
-                                        "Liberation Serif"  # Common on Linux systems)
-                                        ))
-            i += 15
+        return text_batch
@@ -1,6 +1,8 @@
 import math
 import arcade
 
+from text_batch import TextBatch
+
 
 class TextBox(arcade.Sprite):
     def __init__(self, x, y, width, height, text):
@@ -11,21 +13,22 @@ class TextBox(arcade.Sprite):
         self.height = height
         self.text = text
 
+        # Lines of the text, laid out on the first show only
+        self.text_batch = None
+
     def show(self):
         # Draw the background rectangle
-        liste_ligne = self.text.splitlines()
         arcade.draw_rectangle_filled(self.x, self.y, self.width, self.height, arcade.color.WHITE)
 
         # Draw the border
         arcade.draw_rectangle_outline(self.x, self.y, self.width, self.height, arcade.color.BLACK)
 
         # Draw the text
-        i = 0
-        for ligne in liste_ligne:
-            arcade.draw_text(ligne, self.x - self.width / 2 + 10, self.y + self.height / 2 - 10 - i, arcade.color.BLACK,
-                             12,
-                             width=int(self.width - 20), align="left", anchor_x="left", anchor_y="top")
-            i += 20
+        if self.text_batch is None:
+            self.text_batch = TextBatch()
+            self.text_batch.add_lines(self.text, self.x - self.width / 2 + 10, self.y + self.height / 2 - 10, 20,
+                                      color=arcade.color.BLACK, font_size=12)
+        self.text_batch.draw()
 
 
 def dist_between_sprites(sprite1, sprite2):
@@ -0,0 +1,195 @@
+import math
+from array import array
+
+import pytiled_parser
+
+
+class OccupancyGrid:
+    """
+    Number of platforms covering each tile of a level, in tile coordinates.
+    A tile (column, row) is covered by a sprite if the sprite contains the point at 1 pixel from the bottom-left
+    corner of the tile, which is the point user_functions.is_empty used to query the sprite lists with.
+    Tiles outside of the map are kept apart, so that any coordinate can be queried.
+    """
+
+    def __init__(self, tile_size, columns, rows):
+        """
+        Creates an empty grid.
+
+        Args:
+            tile_size: size of one tile in pixels, adapted to the level scaling
+            columns: number of columns of the map
+            rows: number of rows of the map
+        """
+        self.tile_size = tile_size
+        self.columns = columns
+        self.rows = rows
+
+        # Number of sprites covering each tile, column by column
+        self.cells = array("H", bytes(2 * columns * rows))
+        # Same for the tiles outside of the map, keyed by (column, row)
+        self.outside_cells = {}
+
+    @classmethod
+    def from_sprite_lists(cls, tile_size, columns, rows, sprite_lists):
+        """
+        Builds the grid of the sprites of a level.
+
+        Args:
+            tile_size: size of one tile in pixels, adapted to the level scaling
+            columns: number of columns of the map
+            rows: number of rows of the map
+            sprite_lists: sprite lists of the platforms (e.g. Platforms and BackgroundPlatforms layers)
+
+        Returns: OccupancyGrid
+        """
+        grid = cls(tile_size, columns, rows)
+        for sprite_list in sprite_lists:
+            for sprite in sprite_list:
+                grid.add_sprite(sprite)
+        return grid
+
+    def point(self, column, row):
+        """ Returns the point of a tile checked against the sprites. """
+        return column * self.tile_size + 1, row * self.tile_size + 1
+
+    def covered_tiles(self, sprite):
+        """
+        Lists the tiles covered by a sprite.
+
+        Args:
+            sprite: arcade.Sprite
+
+        Returns: list of (column, row) tuples
+        """
+        # Candidates are the tiles whose point is inside the bounding box of the hit box
+        first_column = math.ceil((sprite.left - 1) / self.tile_size)
+        last_column = math.floor((sprite.right - 1) / self.tile_size)
+        first_row = math.ceil((sprite.bottom - 1) / self.tile_size)
+        last_row = math.floor((sprite.top - 1) / self.tile_size)
+
+        tiles = []
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                if sprite.collides_with_point(self.point(column, row)):
+                    tiles.append((column, row))
+        return tiles
+
+    def _add(self, column, row, count):
+        """ Adds count to the number of sprites covering a tile. """
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            self.cells[column * self.rows + row] += count
+        else:
+            self.outside_cells[column, row] = self.outside_cells.get((column, row), 0) + count
+
+    def add_sprite(self, sprite):
+        """ Marks the tiles covered by a sprite as occupied. """
+        for column, row in self.covered_tiles(sprite):
+            self._add(column, row, 1)
+
+    def remove_sprite(self, sprite):
+        """ Releases the tiles covered by a sprite ; the sprite must not have moved since it was added. """
+        for column, row in self.covered_tiles(sprite):
+            self._add(column, row, -1)
+
+    def is_occupied(self, column, row):
+        """
+        Checks if a tile is covered by at least one sprite.
+
+        Args:
+            column: column of the tile (int)
+            row: row of the tile (int)
+
+        Returns: bool
+        """
+        if 0 <= column < self.columns and 0 <= row < self.rows:
+            return self.cells[column * self.rows + row] > 0
+        return self.outside_cells.get((column, row), 0) > 0
+
+
+def tile_offsets(tile_map, tile, scaling, tile_size):
+    """
+    Lists the tiles covered by the sprite of a tile placed at the origin of the map, relative to its own tile.
+
+    Args:
+        tile_map: arcade.TileMap creating the sprites of the tiles
+        tile: pytiled_parser.Tile
+        scaling: scaling of the tiles
+        tile_size: size of one tile in pixels, adapted to the level scaling
+
+    Returns: list of (column, row) tuples
+    """
+    sprite = tile_map._create_sprite_from_tile(tile, scaling=scaling)
+    if sprite is None:
+        return []
+    sprite.center_x = sprite.width / 2
+    sprite.center_y = sprite.height / 2
+    return OccupancyGrid(tile_size, 0, 0).covered_tiles(sprite)
+
+
+def tile_occupancy(tiled_map, scaling, layers, tile_size, min_columns=0):
+    """
+    Computes which tiles of a map are covered by the sprites of some layers, from the arrays of the TMX layers instead
+    of the sprites : the tiles covered by the sprite of each tile id are computed once, then marked for all the cells
+    of the layers holding that id at once. The tiles of the map must be the size of the grid tiles.
+
+    Args:
+        tiled_map: pytiled_parser.TiledMap
+        scaling: scaling of the tiles
+        layers: names of the layers of the platforms
+        tile_size: size of one tile in pixels, adapted to the level scaling
+        min_columns: minimum number of columns of the result, the columns right of the map are empty
+
+    Returns: numpy array of bool, indexed by (column, row) from the bottom-left corner of the map ; it has at least
+    one empty row above the highest covered tile
+    """
+    import arcade
+    import attr
+    import numpy
+
+    # Only creates the sprites of the tiles asked, the layers are not built
+    tile_map = arcade.TileMap(scaling=scaling, tiled_map=attr.evolve(tiled_map, layers=[]))
+
+    # Cells of each tile id in the layers, from the bottom-left corner
+    cells = {}
+    for layer in tiled_map.layers:
+        if layer.name not in layers or not isinstance(layer, pytiled_parser.TileLayer):
+            continue
+        data = numpy.asarray(layer.data, dtype=numpy.int64)[::-1].T
+        for gid in numpy.unique(data[data != 0]):
+            columns, rows = numpy.nonzero(data == gid)
+            cells.setdefault(int(gid), []).append((columns, rows))
+
+    offsets = {}
+    for gid in cells:
+        tile = tile_map._get_tile_by_gid(gid)
+        offsets[gid] = tile_offsets(tile_map, tile, scaling, tile_size) if tile is not None else []
+
+    top = max([row for tiles in offsets.values() for _, row in tiles], default=0)
+    occupied = numpy.zeros((max(tiled_map.map_size.width, min_columns), tiled_map.map_size.height + top + 1),
+                           dtype=bool)
+    for gid, positions in cells.items():
+        for columns, rows in positions:
+            for column_offset, row_offset in offsets[gid]:
+                covered_columns = columns + column_offset
+                covered_rows = rows + row_offset
+                inside = (covered_columns >= 0) & (covered_columns < occupied.shape[0]) & (covered_rows >= 0)
+                occupied[covered_columns[inside], covered_rows[inside]] = True
+    return occupied
+
+
+def first_free_rows(occupied, offset, columns_num):
+    """
+    Computes the first free row of each column, from the bottom of the map, like the blocks are stacked by
+    user_functions.place_block : a column full up to the top of the map is free right above it.
+
+    Args:
+        occupied: numpy array of bool, see tile_occupancy
+        offset: first column where blocks can be placed
+        columns_num: number of columns displayed on the screen
+
+    Returns: list (first_free_slots), starting at the offset column
+    """
+    import numpy
+
+    return [int(row) for row in numpy.argmin(occupied[offset:columns_num], axis=1)]
@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from constants import SCREEN_WIDTH, TILE_SIZE
+
+# Directory of the game, levels and assets paths are relative to it
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def derive_level(level_data, screen_width=SCREEN_WIDTH, tile_size=TILE_SIZE):
+    """
+    Computes the data of a level derived from its TMX file, and checks the hand-edited data against the map.
+    The tiles are checked against the hit boxes of their sprites, like user_functions.place_block and is_empty do, so
+    the derived data matches the game exactly ; only the sprite of each tile id is built, no window is needed.
+
+    Args:
+        level_data: dict, data of the level from levels.json
+        screen_width: width of the screen in pixels
+        tile_size: size of a tile in the TMX file, in pixels
+
+    Returns: dict with the derived data (first_free_slots, end_of_map, map_width, map_height) and the list of
+    warnings about the level
+    """
+    # Only imported by the worker processes
+    import level_cache
+    import occupancy
+    from levelpack import OCCUPANCY_LAYERS
+
+    scaled_tile_size = tile_size * level_data["scaling"]
+    columns_num = int(screen_width // scaled_tile_size)
+    tiled_map = level_cache.get_tiled_map(level_data["tilemap_path"])
+    columns, rows = tiled_map.map_size.width, tiled_map.map_size.height
+    occupied = occupancy.tile_occupancy(tiled_map, level_data["scaling"], OCCUPANCY_LAYERS, scaled_tile_size,
+                                        columns_num)
+
+    # The level ends at the right edge of the screen. The camera follows the player up to the right edge of the map of
+    # a level marked as scrolling in levels.json
+    derived = {
+        "first_free_slots": occupancy.first_free_rows(occupied, level_data["offset"], columns_num),
+        "end_of_map": int(columns * scaled_tile_size) if level_data.get("scrolling") else screen_width,
+        "map_width": columns,
+        "map_height": rows,
+        "warnings": [],
+    }
+
+    if not 0 <= level_data["offset"] < columns_num:
+        derived["warnings"].append(f"offset {level_data['offset']} is outside of the {columns_num} columns "
+                                   f"displayed")
+
+    spawn_column = int(level_data["spawn_x"] // scaled_tile_size)
+    spawn_row = int(level_data["spawn_y"] // scaled_tile_size)
+    if not (0 <= spawn_column < columns and 0 <= spawn_row < rows):
+        derived["warnings"].append(f"spawn ({level_data['spawn_x']}, {level_data['spawn_y']}) is outside of the map")
+    elif occupied[spawn_column, spawn_row]:
+        derived["warnings"].append(f"spawn ({level_data['spawn_x']}, {level_data['spawn_y']}) is inside a platform, "
+                                   f"tile ({spawn_column}, {spawn_row})")
+
+    if level_data.get("first_free_slots") != derived["first_free_slots"]:
+        derived["warnings"].append("first_free_slots did not match the map")
+
+    return derived
+
+
+def preprocess_levels(levels, jobs=None, screen_width=SCREEN_WIDTH):
+    """
+    Computes the derived data of all the levels, in parallel.
+
+    Args:
+        levels: list of the levels data, from levels.json
+        jobs: number of worker processes, the number of cores by default
+        screen_width: width of the screen in pixels
+
+    Returns: list of the derived data of the levels, see derive_level
+    """
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(derive_level, levels, [screen_width] * len(levels)))
+
+
+def main():
+    """ Computes the derived data of the levels and writes it back to the levels file, or to a sidecar file. """
+    parser = argparse.ArgumentParser(description="Computes the data of the levels derived from their TMX files.")
+    parser.add_argument("-l", "--levels", default="levels.json", help="path of the levels file")
+    parser.add_argument("-s", "--sidecar", help="JSON file the derived data is written to, instead of the levels file")
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only show the warnings, write nothing")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: number of cores)")
+    parser.add_argument("--pack", action="store_true", help="build the level pack once the levels file is written")
+    args = parser.parse_args()
+
+    levels_path = os.path.relpath(os.path.abspath(args.levels), GAME_DIR)
+    sidecar_path = os.path.abspath(args.sidecar) if args.sidecar else None
+    os.chdir(GAME_DIR)
+
+    with open(levels_path, "r") as read_levels_file:
+        levels = json.loads(read_levels_file.read())
+
+    all_derived = preprocess_levels(levels, args.jobs)
+    for level, (level_data, derived) in enumerate(zip(levels, all_derived)):
+        for warning in derived["warnings"]:
+            print(f"Level {level} ({level_data['name']}) : {warning}", file=sys.stderr)
+
+    if args.dry_run:
+        return
+
+    if sidecar_path:
+        sidecar = [dict(derived, name=level_data["name"]) for level_data, derived in zip(levels, all_derived)]
+        with open(sidecar_path, "w") as sidecar_file:
+            json.dump(sidecar, sidecar_file, indent=2)
+        return
+
+    for level_data, derived in zip(levels, all_derived):
+        level_data["first_free_slots"] = derived["first_free_slots"]
+        level_data["end_of_map"] = derived["end_of_map"]
+    with open(levels_path, "w") as levels_file:
+        json.dump(levels, levels_file, indent=2)
+
+    if args.pack:
+        import levelpack
+        levelpack.build_pack(levels_path)
+
+
+if __name__ == "__main__":
+    main()
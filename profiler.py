@@ -0,0 +1,192 @@
+import csv
+import os
+import time
+from array import array
+
+import arcade
+
+# Set this environment variable to profile the game (e.g. GAME_PROFILE=1 python main.py)
+PROFILE_ENV = "GAME_PROFILE"
+
+# Phases of a frame, in the order they happen
+PHASES = ("physics", "pipe", "sandbox", "animation", "draw_scene", "draw_gui", "textbox")
+
+# Number of frames kept, 10 seconds at 60 fps
+BUFFER_SIZE = 600
+
+# Time between two refreshes of the overlay text, in seconds
+OVERLAY_REFRESH = 0.5
+
+# Percentiles shown by the overlay
+PERCENTILES = (50, 95, 99)
+
+# File written by F4 in the game
+CSV_PATH = "profile.csv"
+
+
+def get_profiler():
+    """
+    Returns a profiler if profiling is enabled by the GAME_PROFILE environment variable.
+
+    Returns: FrameProfiler or None
+    """
+    if os.environ.get(PROFILE_ENV, "") not in ("", "0"):
+        return FrameProfiler()
+    return None
+
+
+class FrameProfiler:
+    """
+    Time spent in each phase of the last frames, kept in a ring buffer.
+    The time of a phase is measured by the caller : start = profiler.clock() before the phase, then
+    start = profiler.record(phase, start) after it, which also starts the measure of the next phase.
+    """
+
+    def __init__(self, size=BUFFER_SIZE):
+        """
+        Creates an empty profiler.
+
+        Args:
+            size: number of frames kept
+        """
+        self.size = size
+        self.clock = time.perf_counter
+
+        # Time of each phase (and of the whole frame) for the last frames, in seconds
+        self.samples = {phase: array("d", bytes(8 * size)) for phase in PHASES + ("frame",)}
+        # Index of the current frame in the buffer, and number of frames recorded
+        self.index = -1
+        self.count = 0
+        self.frame_start = None
+
+        # On-screen overlay
+        self.show_overlay = False
+        self.overlay_text = None
+        self.overlay_refresh = 0.
+
+    def begin_frame(self):
+        """ Starts a new frame, called at the beginning of on_update. """
+        now = self.clock()
+        if self.frame_start is not None:
+            self.samples["frame"][self.index] = now - self.frame_start
+        self.frame_start = now
+
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+        for phase in PHASES:
+            self.samples[phase][self.index] = 0.
+
+    def record(self, phase, start):
+        """
+        Adds the time elapsed since start to a phase of the current frame.
+
+        Args:
+            phase: name of the phase, in PHASES
+            start: value of clock() at the beginning of the phase
+
+        Returns: value of clock() now, the start of the next phase
+        """
+        now = self.clock()
+        if self.index >= 0:
+            self.samples[phase][self.index] += now - start
+        return now
+
+    def last_frames(self, phase):
+        """
+        Returns the samples of a phase, oldest first. The current frame is not complete and left out.
+
+        Args:
+            phase: name of the phase, or "frame"
+
+        Returns: list of durations in seconds
+        """
+        samples = self.samples[phase]
+        first = (self.index - self.count + 1) % self.size
+        ordered = [samples[(first + frame) % self.size] for frame in range(self.count)]
+        return ordered[:-1]
+
+    def percentiles(self, phase):
+        """
+        Computes the percentiles of a phase over the last frames.
+
+        Args:
+            phase: name of the phase, or "frame"
+
+        Returns: list of durations in seconds, one per value of PERCENTILES
+        """
+        samples = sorted(self.last_frames(phase))
+        if not samples:
+            return [0. for _ in PERCENTILES]
+        return [samples[min(len(samples) - 1, len(samples) * percentile // 100)] for percentile in PERCENTILES]
+
+    def summary(self, scene=None):
+        """
+        Describes the last frames : frame time, percentiles of each phase and sprites of each layer of the scene.
+
+        Args:
+            scene: arcade.Scene whose sprites are counted, optional
+
+        Returns: str
+        """
+        frames = self.last_frames("frame")
+        mean = sum(frames) / len(frames) if frames else 0.
+        lines = [f"frame {mean * 1000:.2f} ms ({1 / mean if mean else 0.:.0f} fps) over {len(frames)} frames",
+                 "phase        " + "".join(f"p{percentile:<7}" for percentile in PERCENTILES)]
+        for phase in PHASES + ("frame",):
+            lines.append(f"{phase:<13}" + "".join(f"{value * 1000:<8.2f}" for value in self.percentiles(phase)))
+
+        if scene is not None:
+            lines.append("sprites : " + ", ".join(f"{name} {len(sprite_list)}"
+                                                  for name, sprite_list in scene.name_mapping.items()))
+        return "\n".join(lines)
+
+    def toggle_overlay(self):
+        """ Shows or hides the overlay. """
+        self.show_overlay = not self.show_overlay
+        self.overlay_refresh = 0.
+
+    def draw_overlay(self, scene, width, height):
+        """
+        Draws the overlay in the top left corner of the screen, if it is shown. Called with the GUI camera active.
+        The text is only updated every OVERLAY_REFRESH seconds.
+
+        Args:
+            scene: arcade.Scene of the level
+            width: width of the screen
+            height: height of the screen
+
+        Returns: None
+        """
+        if not self.show_overlay:
+            return
+
+        if self.overlay_text is None:
+            self.overlay_text = arcade.Text("", 10, height - 10, arcade.color.WHITE, font_size=10, width=width - 20,
+                                            font_name=("Courier New", "Courier", "Liberation Mono"),
+                                            anchor_y="top", multiline=True)
+
+        now = self.clock()
+        if now >= self.overlay_refresh:
+            self.overlay_text.text = self.summary(scene)
+            self.overlay_refresh = now + OVERLAY_REFRESH
+
+        arcade.draw_lrtb_rectangle_filled(0, self.overlay_text.content_width + 20, height,
+                                          height - self.overlay_text.content_height - 20, (0, 0, 0, 160))
+        self.overlay_text.draw()
+
+    def dump_csv(self, path):
+        """
+        Writes the samples of the last frames to a CSV file, one line per frame, in milliseconds.
+
+        Args:
+            path: path of the CSV file
+
+        Returns: None
+        """
+        columns = PHASES + ("frame",)
+        samples = [self.last_frames(phase) for phase in columns]
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(("index",) + columns)
+            for index, values in enumerate(zip(*samples)):
+                writer.writerow([index] + [f"{value * 1000:.4f}" for value in values])
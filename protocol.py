@@ -0,0 +1,153 @@
+import struct
+import threading
+from collections import deque
+
+# Types of messages
+SUBMIT = 1  # kivy -> arcade : code to run
+ACCEPTED = 2  # arcade -> kivy : the code is waiting for a sandbox worker
+OUTPUT = 3  # arcade -> kivy : part of the output of the code
+RESULT = 4  # arcade -> kivy : end of the output, the payload is ERROR if the code failed
+
+ERROR = "error"
+
+# Header of a frame : type, request id and length of the payload
+HEADER = struct.Struct(">BII")
+
+# Maximum size of the output sent in one frame, in characters
+CHUNK_SIZE = 4096
+
+
+def encode(message_type, request_id, payload=""):
+    """
+    Builds the frame of a message.
+
+    Args:
+        message_type: type of the message (SUBMIT, ACCEPTED, OUTPUT or RESULT)
+        request_id: id of the submission the message belongs to
+        payload: str
+
+    Returns: bytes
+    """
+    data = payload.encode("utf-8")
+    return HEADER.pack(message_type, request_id, len(data)) + data
+
+
+def decode(frame):
+    """
+    Reads the message of a frame.
+
+    Args:
+        frame: bytes built by encode
+
+    Returns: tuple (message_type, request_id, payload)
+    Raises: ValueError if the frame is truncated.
+    """
+    message_type, request_id, length = HEADER.unpack_from(frame)
+    data = frame[HEADER.size:]
+    if len(data) != length:
+        raise ValueError(f"Truncated frame : {len(data)} bytes of payload instead of {length}.")
+    return message_type, request_id, data.decode("utf-8")
+
+
+class Channel:
+    """
+    Exchanges messages through a multiprocessing connection.
+    Frames are received by a background thread, so that neither process ever waits for the other one :
+    messages are either passed to a callback, or kept until receive is called.
+    """
+
+    def __init__(self, connection, on_message=None):
+        """
+        Starts receiving the messages.
+
+        Args:
+            connection: end of a multiprocessing Pipe
+            on_message: function called with (message_type, request_id, payload) for each message, from the
+                background thread. If None, messages are kept for receive.
+        """
+        self.connection = connection
+        self.on_message = on_message
+        self.messages = deque()
+        self.closed = False
+        self.send_lock = threading.Lock()
+
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self):
+        """ Receives the frames until the connection is closed. Runs in the background thread. """
+        while True:
+            try:
+                message = decode(self.connection.recv_bytes())
+            except (EOFError, OSError):
+                self.closed = True
+                return
+
+            if self.on_message is not None:
+                self.on_message(*message)
+            else:
+                self.messages.append(message)
+
+    def receive(self):
+        """
+        Returns the messages received since the last call. Costs nothing when there are none.
+
+        Returns: list of (message_type, request_id, payload) tuples
+        """
+        messages = []
+        while self.messages:
+            messages.append(self.messages.popleft())
+        return messages
+
+    def send(self, message_type, request_id, payload=""):
+        """
+        Sends a message.
+
+        Args:
+            message_type: type of the message
+            request_id: id of the submission the message belongs to
+            payload: str
+
+        Returns: None
+        """
+        if self.closed:
+            return
+        with self.send_lock:
+            try:
+                self.connection.send_bytes(encode(message_type, request_id, payload))
+            except (EOFError, OSError):
+                self.closed = True
+
+    def send_partial_output(self, request_id, output):
+        """
+        Sends a part of the output of a submission, in chunks.
+
+        Args:
+            request_id: id of the submission
+            output: str, part of the output of the code
+
+        Returns: None
+        """
+        for start in range(0, len(output), CHUNK_SIZE):
+            self.send(OUTPUT, request_id, output[start:start + CHUNK_SIZE])
+
+    def send_output(self, request_id, output, error=False, streamed=""):
+        """
+        Sends the output of a submission, in chunks, followed by its result.
+
+        Args:
+            request_id: id of the submission
+            output: str, output of the code
+            error: True if the code failed
+            streamed: beginning of the printed text, already sent by send_partial_output while the code ran ; it
+                is not sent again. The rest of the printed text is sent first, then the error message, if any, on
+                its own line.
+
+        Returns: None
+        """
+        start = output.find(streamed) if streamed else -1
+        if start > 0:
+            output = output[start + len(streamed):] + "\n" + output[:start].rstrip("\n")
+        elif start == 0:
+            output = output[len(streamed):]
+        self.send_partial_output(request_id, output)
+        self.send(RESULT, request_id, ERROR if error else "")
@@ -0,0 +1,285 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+from snapshot import reset_level
+
+# Directory of the game, levels and assets paths are relative to it
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Set this environment variable to the path of a log to record the session (e.g. GAME_RECORD=session.log.gz)
+RECORD_ENV = "GAME_RECORD"
+
+# Types of events, each event is a JSON list starting with its type
+UPDATE = "u"  # [UPDATE, delta_time] : one frame
+PRESS = "p"  # [PRESS, key]
+RELEASE = "r"  # [RELEASE, key]
+SETUP = "x"  # [SETUP, level, frog] : the level is set up by the player (start of the game, restart)
+RESET = "z"  # [RESET] : the level is reset by the player, rolled back from its snapshot
+SUBMIT = "s"  # [SUBMIT, job_id, code] : code submitted through the kivy interface
+APPLY = "a"  # [APPLY, job_id, reset, error] : the result of a submission is applied to the game
+
+# Number of frames between two flushes of the log, so that a crash loses at most a few seconds
+FLUSH_FRAMES = 600
+
+
+def get_recorder():
+    """
+    Returns a recorder if recording is enabled by the GAME_RECORD environment variable.
+
+    Returns: Recorder or None
+    """
+    path = os.environ.get(RECORD_ENV, "")
+    if path:
+        return Recorder(path)
+    return None
+
+
+class Recorder:
+    """
+    Writes the inputs of a session to a gzipped log, one event per line : every frame with its delta time, the keys,
+    the setups triggered by the player, and the submissions with the frame their result was applied at.
+    This is all the game needs to play the session again, see Replayer.
+    """
+
+    def __init__(self, path):
+        """
+        Opens the log.
+
+        Args:
+            path: path of the log file
+        """
+        self.log_file = gzip.open(path, "wt", encoding="utf-8")
+        self.frames = 0
+
+    def write(self, *event):
+        """ Appends an event to the log. """
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(event, separators=(",", ":")) + "\n")
+
+    def update(self, delta_time):
+        """ Records a frame. """
+        self.write(UPDATE, delta_time)
+        self.frames += 1
+        if self.frames % FLUSH_FRAMES == 0 and self.log_file is not None:
+            self.log_file.flush()
+
+    def key(self, key, pressed):
+        """ Records a key press or release. """
+        self.write(PRESS if pressed else RELEASE, key)
+
+    def setup(self, arcade_game):
+        """ Records a setup of the level triggered by the player, before it happens. """
+        self.write(SETUP, arcade_game.save["current_level"], arcade_game.frog)
+
+    def reset(self):
+        """ Records a reset of the level by the player, before it happens. """
+        self.write(RESET)
+
+    def submit(self, job_id, code):
+        """ Records a code submission. """
+        self.write(SUBMIT, job_id, code)
+
+    def apply(self, job_id, reset, error):
+        """
+        Records the application of the result of a submission.
+
+        Args:
+            job_id: id of the submission
+            reset: True if the level was reset and the blocks placed by the code were added
+            error: True if the code failed (the player can no longer move)
+
+        Returns: None
+        """
+        self.write(APPLY, job_id, reset, error)
+
+    def close(self):
+        """ Closes the log. """
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+
+def read_log(path):
+    """
+    Reads the events of a log. A log that was not closed (game killed) is read up to its last complete event.
+
+    Args:
+        path: path of the log file
+
+    Returns: list of events
+    """
+    events = []
+    with gzip.open(path, "rt", encoding="utf-8") as log_file:
+        try:
+            for line in log_file:
+                events.append(json.loads(line))
+        except (EOFError, ValueError):
+            pass
+    return events
+
+
+def apply_submission(arcade_game, code, reset, error):
+    """
+    Applies a submission like sandbox.apply_result did while recording, by running the code in the game process.
+
+    Args:
+        arcade_game: game instance
+        code: str containing code performed by user
+        reset: True if the result changed the level
+        error: True if the code failed
+
+    Returns: None
+    """
+    import code_input
+
+    # The code was stopped or ran for another level, it had no effect on the game
+    if reset:
+        code_input.user_instructions(arcade_game, code, [])
+    if error:
+        arcade_game.can_move = False
+
+
+class Replayer:
+    """
+    Feeds the events of a log back to a game, frame by frame. Works with game.Game and headless.HeadlessGame.
+    """
+
+    def __init__(self, events):
+        """
+        Prepares the replay.
+
+        Args:
+            events: list of events, see read_log
+        """
+        self.events = events
+        self.position = 0
+        self.frame = 0
+        # Code of the submissions whose result is not applied yet, by job id
+        self.codes = {}
+        # True while the replayer calls the key handlers of the game, the keyboard is ignored otherwise
+        self.feeding = False
+
+    def step(self, arcade_game):
+        """
+        Applies the events up to the next frame.
+
+        Args:
+            arcade_game: game instance
+
+        Returns: delta time of the frame, or None if the log is over
+        """
+        self.feeding = True
+        try:
+            while self.position < len(self.events):
+                event = self.events[self.position]
+                self.position += 1
+
+                if event[0] == UPDATE:
+                    self.frame += 1
+                    return event[1]
+                elif event[0] == PRESS:
+                    arcade_game.on_key_press(event[1], 0)
+                elif event[0] == RELEASE:
+                    arcade_game.on_key_release(event[1], 0)
+                elif event[0] == SETUP:
+                    arcade_game.save["current_level"] = event[1]
+                    arcade_game.frog = event[2]
+                    arcade_game.setup()
+                elif event[0] == RESET:
+                    reset_level(arcade_game)
+                elif event[0] == SUBMIT:
+                    self.codes[event[1]] = event[2]
+                elif event[0] == APPLY:
+                    apply_submission(arcade_game, self.codes.pop(event[1]), event[2], event[3])
+        finally:
+            self.feeding = False
+        return None
+
+
+def replay_headless(events):
+    """
+    Replays a log in a headless game, as fast as possible.
+
+    Args:
+        events: list of events, see read_log
+
+    Returns: tuple (game, list of the duration of each frame in seconds)
+    """
+    from headless import HeadlessGame
+
+    arcade_game = HeadlessGame(advance_levels=True)
+    replayer = Replayer(events)
+    durations = []
+    while True:
+        start = time.perf_counter()
+        delta_time = replayer.step(arcade_game)
+        if delta_time is None:
+            return arcade_game, durations
+        arcade_game.on_update(delta_time)
+        durations.append(time.perf_counter() - start)
+
+
+def replay_window(events):
+    """
+    Replays a log in the game window, in real time. The keyboard is ignored, the window closes at the end of the log.
+
+    Args:
+        events: list of events, see read_log
+
+    Returns: None
+    """
+    import multiprocessing
+
+    import arcade
+    from game import Game, SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE
+
+    window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, SCREEN_TITLE)
+    # Nothing is sent by the kivy interface during a replay
+    connection, _ = multiprocessing.Pipe(duplex=True)
+    game_view = Game(connection)
+    game_view.replayer = Replayer(events)
+
+    # The view is drawn before its first update, the level of the first setup is set up beforehand
+    for event in events:
+        if event[0] == SETUP:
+            game_view.save["current_level"] = event[1]
+            game_view.frog = event[2]
+            break
+    game_view.setup()
+    window.show_view(game_view)
+    arcade.run()
+
+
+def main():
+    """ Replays a recorded session, headless by default. """
+    parser = argparse.ArgumentParser(description="Replays a session recorded with GAME_RECORD=<log path>.")
+    parser.add_argument("log", help="path of the log")
+    parser.add_argument("-w", "--window", action="store_true", help="replay in the game window, in real time")
+    parser.add_argument("-n", "--slowest", type=int, default=5, help="number of slowest frames shown (headless)")
+    args = parser.parse_args()
+
+    events = read_log(args.log)
+    os.chdir(GAME_DIR)
+    if args.window:
+        replay_window(events)
+        return
+
+    start = time.perf_counter()
+    arcade_game, durations = replay_headless(events)
+    wall_time = time.perf_counter() - start
+    recorded_time = sum(event[1] for event in events if event[0] == UPDATE)
+
+    print(f"{len(durations)} frames, {recorded_time:.1f} s recorded, replayed in {wall_time:.2f} s "
+          f"({recorded_time / wall_time if wall_time else 0.:.0f}x)", file=sys.stderr)
+    print(f"level {arcade_game.save['current_level']}, {arcade_game.resets} setups", file=sys.stderr)
+    slowest = sorted(range(len(durations)), key=lambda frame: durations[frame], reverse=True)[:args.slowest]
+    for frame in slowest:
+        print(f"frame {frame} : {durations[frame] * 1000:.2f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
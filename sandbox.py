@@ -0,0 +1,369 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+
+import startup
+from snapshot import reset_level
+
+# Default limits of the code run by a worker
+TIMEOUT = 5.
+MEMORY_LIMIT = 256 * 1024 ** 2
+
+# Minimum time between two parts of the output sent by a worker while the code runs, in seconds : the prints are
+# grouped, so that a loop printing does not flood the pipe
+STREAM_INTERVAL = 0.1
+
+TIMEOUT_OUTPUT = "/!\\ TimeoutError : The code was too long to run. hint : look for infinite loops."
+CRASH_OUTPUT = "/!\\ MemoryError : The code used too much memory."
+
+# Set this environment variable to start the workers from a fork server (e.g. GAME_FORKSERVER=1), which imports the
+# game API once instead of each worker importing it again ; not available on Windows
+FORKSERVER_ENV = "GAME_FORKSERVER"
+FORKSERVER_PRELOAD = ["code_input", "headless"]
+
+
+def limit_memory(memory_limit):
+    """
+    Limits the memory the current process can allocate on top of what it already uses.
+    Only available on systems exposing /proc (linux), the limit is ignored elsewhere.
+
+    Args:
+        memory_limit: memory in bytes
+
+    Returns: None
+    """
+    try:
+        import resource
+        with open("/proc/self/statm", "r") as statm:
+            used = int(statm.read().split()[0]) * resource.getpagesize()
+    except (ImportError, OSError):
+        return
+
+    resource.setrlimit(resource.RLIMIT_AS, (used + memory_limit, resource.RLIM_INFINITY))
+
+
+def run_job(job, games, on_print=None):
+    """
+    Runs a submission in a headless game of its level. Called inside a worker.
+
+    Args:
+        job: dict with the id, code, level and frog state of the submission
+        games: dict of the headless games of the worker, by level, reused from one job to the other
+        on_print: function called with the text of each print of the code, while the code runs
+
+    Returns: dict, the result to apply to the game (see apply_result)
+    """
+    import code_input
+    from headless import HeadlessGame
+
+    if job["level"] not in games:
+        games[job["level"]] = HeadlessGame(job["level"], job["frog"])
+        games[job["level"]].setup()
+    arcade_game = games[job["level"]]
+
+    # The previous code may have switched the character
+    if arcade_game.frog != job["frog"]:
+        arcade_game.frog = job["frog"]
+        arcade_game.setup()
+
+    result = {"id": job["id"], "level": job["level"], "reset": False}
+    result["output"] = code_input.check_code(arcade_game, job["code"], [])
+    if result["output"]:
+        return result
+
+    result["output"] = code_input.run_code(arcade_game, job["code"], on_print=on_print)
+
+    # Blocks placed since the last setup of the level, with the state they left
+    platforms = arcade_game.scene["Platforms"]
+    result["reset"] = True
+    result["frog"] = arcade_game.frog
+    result["blocks"] = [(block.block_type, block.center_x, block.center_y)
+                        for block in platforms[arcade_game.level_snapshot.platforms_count:]]
+    result["first_free_slots"] = list(arcade_game.level_data["first_free_slots"])
+    return result
+
+
+def get_context():
+    """
+    Returns the multiprocessing context the workers are started with : the fork server if it is enabled by the
+    GAME_FORKSERVER environment variable, spawn otherwise.
+
+    Returns: multiprocessing context
+    """
+    if os.environ.get(FORKSERVER_ENV, "") and "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def preload():
+    """
+    Starts the fork server if it is enabled, so that it imports the game API while the game starts, instead of when
+    the first workers are started.
+
+    Returns: None
+    """
+    if get_context().get_start_method() == "forkserver":
+        from multiprocessing import forkserver
+        forkserver.ensure_running()
+
+
+class OutputStream:
+    """ Sends the output printed by a job to the pool while the job runs, grouped by STREAM_INTERVAL. """
+
+    def __init__(self, connection, job_id, interval=STREAM_INTERVAL):
+        self.connection = connection
+        self.job_id = job_id
+        self.interval = interval
+
+        # Prints not sent yet, and time of the last part sent
+        self.parts = []
+        self.last_sent = time.monotonic()
+
+    def write(self, text):
+        """ Queues the text of a print, and sends the queued prints once the interval is over. """
+        self.parts.append(text)
+        now = time.monotonic()
+        if now - self.last_sent >= self.interval:
+            self.connection.send({"id": self.job_id, "partial_output": "".join(self.parts)})
+            self.parts = []
+            self.last_sent = now
+
+
+def worker_main(connection, memory_limit, runner=run_job):
+    """
+    Main loop of a worker : runs the jobs received through the connection and sends back their results.
+
+    Args:
+        connection: end of the pipe shared with the pool
+        memory_limit: memory the code of the jobs can allocate, in bytes
+        runner: function running a job, see SandboxPool
+
+    Returns: None
+    """
+    # Import the game API before the first job, unless the fork server already did
+    import code_input
+    import headless
+
+    limit_memory(memory_limit)
+    games = {}
+    startup.mark("sandbox worker ready")
+    connection.send("ready")
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            return
+        # The prints not sent yet are part of the output of the result
+        connection.send(runner(job, games, on_print=OutputStream(connection, job["id"]).write))
+
+
+class SandboxWorker:
+    """ Process running the user code, and the job it is running. """
+
+    def __init__(self, context, memory_limit, runner=run_job):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(worker_connection, memory_limit, runner),
+                                       daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+        # True once the game API is imported
+        self.ready = False
+        self.job = None
+        self.deadline = None
+
+    def stop(self):
+        """ Kills the worker process. """
+        self.process.kill()
+        self.connection.close()
+
+
+class SandboxPool:
+    """
+    Pool of worker processes running the user code outside of the game process, with a time and memory limit.
+    Workers are started in advance, and a killed worker is replaced in the background, so that submitting code and
+    getting the results never blocks the game loop.
+    """
+
+    def __init__(self, size=2, timeout=TIMEOUT, memory_limit=MEMORY_LIMIT, runner=run_job):
+        """
+        Starts the workers.
+
+        Args:
+            size: number of workers
+            timeout: time limit of a job, in seconds
+            memory_limit: memory the user code can allocate, in bytes
+            runner: module level function running a job in a worker, called with the job (dict), the headless
+                games of the worker (dict, by level) and on_print, the function streaming its prints ; run_job by
+                default
+        """
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.runner = runner
+
+        # Workers are started from a fresh interpreter or the fork server, they do not inherit the window of the game
+        self.context = get_context()
+        self.workers = [SandboxWorker(self.context, memory_limit, runner) for _ in range(size)]
+        self.workers_lock = threading.Lock()
+
+        # Jobs waiting for a ready worker
+        self.jobs = deque()
+        self.next_id = 0
+
+    def submit(self, code, level, frog):
+        """
+        Queues a submission, its result is returned later on by poll.
+
+        Args:
+            code: str containing code performed by user
+            level: index of the current level
+            frog: True if the player plays the frog
+
+        Returns: id of the job
+        """
+        return self.submit_job({"code": code, "level": level, "frog": frog})
+
+    def submit_job(self, job):
+        """
+        Queues a job for the runner of the pool, its result is returned later on by poll.
+
+        Args:
+            job: dict with at least the level of the job, its id is set by the pool
+
+        Returns: id of the job
+        """
+        self.next_id += 1
+        job["id"] = self.next_id
+        self.jobs.append(job)
+        self.dispatch()
+        return self.next_id
+
+    def busy(self):
+        """
+        Checks if some jobs are waiting or running. When it is not the case, poll has nothing to do.
+
+        Returns: bool
+        """
+        with self.workers_lock:
+            return bool(self.jobs) or any(worker.job is not None for worker in self.workers)
+
+    def dispatch(self):
+        """ Sends the waiting jobs to the ready workers. """
+        with self.workers_lock:
+            workers = list(self.workers)
+
+        for worker in workers:
+            if not self.jobs:
+                return
+            if worker.ready and worker.job is None:
+                worker.job = self.jobs.popleft()
+                worker.deadline = time.monotonic() + self.timeout
+                worker.connection.send(worker.job)
+
+    def poll(self, on_output=None):
+        """
+        Collects the results of the finished jobs, and stops the jobs over their time limit. Never blocks.
+
+        Args:
+            on_output: function called with (job id, text) for each part of the output printed by the jobs still
+                running ; the output of a job is also in its result, whole
+
+        Returns: list of results (dict)
+        """
+        results = []
+        with self.workers_lock:
+            workers = list(self.workers)
+
+        for worker in workers:
+            try:
+                while worker.connection.poll():
+                    message = worker.connection.recv()
+                    if message == "ready":
+                        worker.ready = True
+                    elif "partial_output" in message:
+                        if on_output is not None:
+                            on_output(message["id"], message["partial_output"])
+                    else:
+                        results.append(message)
+                        worker.job = None
+                crashed = not worker.process.is_alive()
+            except (EOFError, OSError):
+                crashed = True
+
+            if worker.job is not None and time.monotonic() > worker.deadline:
+                results.append({"id": worker.job["id"], "level": worker.job["level"], "reset": False,
+                                "output": TIMEOUT_OUTPUT})
+                self.replace(worker)
+            elif crashed:
+                if worker.job is not None:
+                    results.append({"id": worker.job["id"], "level": worker.job["level"], "reset": False,
+                                    "output": CRASH_OUTPUT})
+                self.replace(worker)
+
+        self.dispatch()
+        return results
+
+    def replace(self, worker):
+        """
+        Kills a worker and starts a new one in the background.
+
+        Args:
+            worker: SandboxWorker to replace
+
+        Returns: None
+        """
+        with self.workers_lock:
+            self.workers.remove(worker)
+        worker.stop()
+
+        def start_worker():
+            new_worker = SandboxWorker(self.context, self.memory_limit, self.runner)
+            with self.workers_lock:
+                self.workers.append(new_worker)
+
+        threading.Thread(target=start_worker, daemon=True).start()
+
+    def close(self):
+        """ Stops all the workers. """
+        with self.workers_lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+
+
+def apply_result(arcade_game, result):
+    """
+    Applies the result of a submission to the game : the level is reset and the blocks placed by the code are added.
+
+    Args:
+        arcade_game: game instance
+        result: dict returned by the pool
+
+    Returns: Buffer text or error.
+    """
+    import user_functions
+
+    # The player has changed level since the submission
+    if result["level"] != arcade_game.save["current_level"] or not result["reset"]:
+        return result["output"]
+
+    if result["frog"] != arcade_game.frog:
+        arcade_game.frog = result["frog"]
+        arcade_game.setup()
+    else:
+        reset_level(arcade_game)
+
+    for block_type, center_x, center_y in result["blocks"]:
+        new_block = user_functions.create_block(arcade_game, block_type)
+        new_block.center_x = center_x
+        new_block.center_y = center_y
+        user_functions.add_block(arcade_game, new_block)
+    user_functions.commit_blocks(arcade_game)
+    arcade_game.level_data["first_free_slots"][:] = result["first_free_slots"]
+
+    return result["output"]
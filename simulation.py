@@ -0,0 +1,210 @@
+import arcade
+
+import entities
+import level_cache
+import snapshot
+import validator
+
+from collision import CollisionLayer
+from constants import SCREEN_WIDTH, GRAVITY
+
+# Duration of a simulation step, in seconds : the player moves at this rate whatever the frame rate
+SIM_DT = 1 / 60
+
+# Maximum number of steps simulated in one frame ; below 60 / MAX_SUBSTEPS frames per second, the game slows
+# down instead of falling further behind
+MAX_SUBSTEPS = 5
+
+
+def setup_level(arcade_game, tile_map):
+    """
+    Sets up the simulated state of the current level from its tile map : scene, occupancy grid, player and physics
+    engine. It is shared by game.Game and headless.HeadlessGame, so that both start every level from the same state.
+
+    Args:
+        arcade_game: game instance, needs the level data and the save
+        tile_map: arcade.TileMap of the level
+
+    Returns: None
+    """
+    arcade_game.tile_map = tile_map
+    arcade_game.scene = arcade.Scene.from_tilemap(tile_map)
+
+    # End of map value, computed by preprocess_levels.py
+    arcade_game.end_of_map = arcade_game.level_data.get("end_of_map", SCREEN_WIDTH)
+
+    # Compile the rules checked on the submitted code
+    validator.get_rules(arcade_game.level_data)
+
+    # Blocks placed before the setup are dropped with the previous scene
+    arcade_game.pending_blocks = []
+    arcade_game.occupancy = level_cache.get_occupancy(arcade_game.save["current_level"], tile_map,
+                                                      [arcade_game.scene["Platforms"],
+                                                       arcade_game.scene["BackgroundPlatforms"]],
+                                                      arcade_game.tile_size * arcade_game.level_data["scaling"])
+
+    # Initialize Player Sprite
+    arcade_game.can_move = True
+    arcade_game.fall_timer = 0.
+    player_sprite = entities.PlayerCharacter(arcade_game.frog)
+    player_sprite.scale = 1.2 * arcade_game.level_data["player_scaling"] * arcade_game.level_data["scaling"]
+    player_sprite.center_x = arcade_game.level_data["spawn_x"]
+    player_sprite.center_y = arcade_game.level_data["spawn_y"]
+    arcade_game.player_sprite = player_sprite
+    arcade_game.scene.add_sprite("Player", player_sprite)
+
+    # Create the physics engine
+    arcade_game.collision_layer = CollisionLayer(arcade_game.scene["Platforms"],
+                                                 arcade_game.tile_size * arcade_game.level_data["scaling"])
+    arcade_game.physics_engine = arcade.PhysicsEnginePlatformer(player_sprite,
+                                                                walls=arcade_game.collision_layer.sprite_list,
+                                                                gravity_constant=GRAVITY)
+
+    # Keep the initial state of the level, to roll it back cheaply
+    arcade_game.level_snapshot = snapshot.LevelSnapshot(arcade_game)
+
+
+def update_player(arcade_game, delta_time):
+    """
+    Moves the player one physics step and applies the level rules : fall damage, falling off the map, reaching the
+    end of the map and auto-jump.
+    It is shared by the arcade window (game.Game) and the headless engine (headless.HeadlessGame), so that both
+    produce the same trajectory.
+
+    Args:
+        arcade_game: game instance, needs a physics engine, a player sprite and the level data
+        delta_time: time elapsed since the last update, in seconds
+
+    Returns: True if the player fell off the map and was put back on its spawn
+    """
+    respawned = False
+
+    # Move the player with the physics engine
+    arcade_game.physics_engine.update()
+    arcade_game.player_sprite.current_pos = (arcade_game.player_sprite.center_x, arcade_game.player_sprite.center_y)
+
+    # Check if the player is still jumping
+    if arcade_game.player_sprite.jumping:
+        if arcade_game.physics_engine.can_jump():
+            arcade_game.player_sprite.jumping = False
+            # Has he fallen for too long ?
+            # max_fall_time == -1 means the level has no fall damage
+            if arcade_game.level_data["max_fall_time"] != -1 \
+                    and arcade_game.fall_timer >= arcade_game.level_data['max_fall_time']:
+                arcade_game.setup()  # reset the level
+            arcade_game.fall_timer = 0
+        else:
+            arcade_game.fall_timer += delta_time
+
+    # Update the jumping state
+    arcade_game.player_sprite.jumping = not arcade_game.physics_engine.can_jump()
+
+    # If debug option enabled, show the jump timer in console
+    if arcade_game.show_timer:
+        print(arcade_game.fall_timer)
+
+    # Did the player fall off the map?
+    if arcade_game.player_sprite.center_y < -100:
+        arcade_game.player_sprite.center_x = arcade_game.level_data["spawn_x"]
+        arcade_game.player_sprite.center_y = arcade_game.level_data["spawn_y"]
+        respawned = True
+
+    # See if the user got to the end of the level
+    if arcade_game.player_sprite.center_x >= arcade_game.end_of_map:
+        arcade_game.next_level()
+
+    # Trigger auto-jump if needed
+    if (arcade_game.player_sprite.walking_right or arcade_game.player_sprite.walking_left) \
+            and arcade_game.player_sprite.last_pos == arcade_game.player_sprite.current_pos:
+        arcade_game.player_sprite.change_y = arcade_game.level_data["player_jump_speed"]
+
+    return respawned
+
+
+def step_player(arcade_game):
+    """
+    Simulates one fixed step of the player : the physics step and level rules, then the position is kept for the
+    auto-jump check of the next step.
+
+    Args:
+        arcade_game: game instance
+
+    Returns: True if the player fell off the map and was put back on its spawn
+    """
+    respawned = update_player(arcade_game, SIM_DT)
+    arcade_game.player_sprite.last_pos = arcade_game.player_sprite.current_pos
+    return respawned
+
+
+class FixedTimestep:
+    """
+    Runs the simulation at a fixed rate, decoupled from the frame rate : the time of the frames is accumulated and
+    consumed by steps of SIM_DT. Fall damage and auto-jump then behave the same on slow and fast machines.
+    The player is drawn between its last two simulated positions, so that the movement stays smooth when the
+    frame rate and the simulation rate differ.
+    """
+
+    def __init__(self, max_substeps=MAX_SUBSTEPS):
+        """
+        Initializer of the accumulator.
+
+        Args:
+            max_substeps: maximum number of steps simulated in one frame
+        """
+        self.max_substeps = max_substeps
+        # Time not simulated yet, always less than a step after advance
+        self.accumulator = 0.
+
+        # Player sprite of the last step, with its position before and after that step
+        self.player_sprite = None
+        self.previous_position = None
+        self.position = None
+
+    def advance(self, arcade_game, delta_time):
+        """
+        Simulates the steps covered by the time elapsed since the last frame.
+
+        Args:
+            arcade_game: game instance
+            delta_time: time elapsed since the last frame, in seconds
+
+        Returns: number of steps simulated
+        """
+        self.accumulator += delta_time
+        steps = 0
+        while self.accumulator >= SIM_DT and steps < self.max_substeps:
+            player_sprite = arcade_game.player_sprite
+            self.previous_position = player_sprite.position
+            respawned = step_player(arcade_game)
+            # The player put back on its spawn, or on a level set up again, is not drawn sliding there
+            if respawned or arcade_game.player_sprite is not player_sprite:
+                self.previous_position = arcade_game.player_sprite.position
+            self.player_sprite = arcade_game.player_sprite
+            self.position = arcade_game.player_sprite.position
+            self.accumulator -= SIM_DT
+            steps += 1
+
+        # Too far behind : the remaining time is dropped
+        if self.accumulator >= SIM_DT:
+            self.accumulator %= SIM_DT
+        return steps
+
+    def interpolate(self, player_sprite):
+        """
+        Moves the player sprite between its last two simulated positions, according to the time accumulated since
+        the last step. Called before drawing, the simulated position must be restored after.
+
+        Args:
+            player_sprite: player sprite of the game
+
+        Returns: simulated position of the player, to restore
+        """
+        position = player_sprite.position
+        # The level was set up, or the player moved, since the last step
+        if player_sprite is not self.player_sprite or position != self.position:
+            return position
+
+        alpha = self.accumulator / SIM_DT
+        player_sprite.position = (self.previous_position[0] + (position[0] - self.previous_position[0]) * alpha,
+                                  self.previous_position[1] + (position[1] - self.previous_position[1]) * alpha)
+        return position
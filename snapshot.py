@@ -0,0 +1,85 @@
+class LevelSnapshot:
+    """
+    State of a level right after its setup : the platforms, the first free slots and the player.
+    Restoring it rolls the level back to its initial state by undoing only what changed (mostly the blocks placed
+    by the user code), which is much cheaper than a full setup.
+    """
+
+    def __init__(self, arcade_game):
+        """
+        Takes a snapshot of the current state of the level.
+
+        Args:
+            arcade_game: game instance, right after its setup
+        """
+        self.scene = arcade_game.scene
+        self.platforms_count = len(arcade_game.scene["Platforms"])
+        self.first_free_slots = list(arcade_game.level_data["first_free_slots"])
+
+        player_sprite = arcade_game.player_sprite
+        self.player_sprite = player_sprite
+        self.player_position = player_sprite.position
+        self.player_texture = player_sprite.texture
+        self.player_facing_direction = player_sprite.facing_direction
+
+    def is_valid(self, arcade_game):
+        """
+        Checks if the snapshot can be restored : the level must not have been set up again since it was taken.
+
+        Args:
+            arcade_game: game instance
+
+        Returns: bool
+        """
+        return arcade_game.scene is self.scene and arcade_game.player_sprite is self.player_sprite
+
+    def restore(self, arcade_game):
+        """
+        Restores the state of the level.
+
+        Args:
+            arcade_game: game instance the snapshot was taken from
+
+        Returns: None
+        """
+        # Remove the blocks added since the snapshot, they are always appended at the end of the list,
+        # and those of the current batch
+        platforms = arcade_game.scene["Platforms"]
+        for block in platforms[self.platforms_count:] + arcade_game.pending_blocks:
+            block.remove_from_sprite_lists()
+            arcade_game.occupancy.remove_sprite(block)
+        arcade_game.pending_blocks = []
+
+        arcade_game.level_data["first_free_slots"][:] = self.first_free_slots
+
+        # Put the player back on its spawn
+        player_sprite = arcade_game.player_sprite
+        player_sprite.position = self.player_position
+        player_sprite.change_x = 0
+        player_sprite.change_y = 0
+        player_sprite.texture = self.player_texture
+        player_sprite.facing_direction = self.player_facing_direction
+        player_sprite.cur_texture = 0
+        player_sprite.walking_right = False
+        player_sprite.walking_left = False
+        player_sprite.jumping = False
+        player_sprite.current_pos = (0, 0)
+        player_sprite.last_pos = (0, 0)
+
+        arcade_game.can_move = True
+        arcade_game.fall_timer = 0.
+
+
+def reset_level(arcade_game):
+    """
+    Resets the current level, restoring its snapshot if possible instead of setting it up again.
+
+    Args:
+        arcade_game: game instance
+
+    Returns: None
+    """
+    if arcade_game.level_snapshot is not None and arcade_game.level_snapshot.is_valid(arcade_game):
+        arcade_game.level_snapshot.restore(arcade_game)
+    else:
+        arcade_game.setup()
@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+import sys
+import time
+
+# Set this environment variable to trace the startup of the game (e.g. GAME_STARTUP_TRACE=1)
+TRACE_ENV = "GAME_STARTUP_TRACE"
+
+# Launch time of the game (time.time()), set by main.py and inherited by the processes of the game
+LAUNCH_TIME_ENV = "GAME_LAUNCH_TIME"
+
+_trace = bool(os.environ.get(TRACE_ENV, ""))
+# Events already traced by this process
+_marked = set()
+# Start of the trace when the game was not launched by main.py (replay, benchmark)
+_import_time = time.time()
+
+
+def set_launch_time():
+    """
+    Records the launch time of the game, for the processes started afterwards.
+
+    Returns: None
+    """
+    os.environ.setdefault(LAUNCH_TIME_ENV, repr(time.time()))
+
+
+def mark(event):
+    """
+    Prints the time elapsed since the launch of the game when a step of the startup is reached, if the startup is
+    traced (see TRACE_ENV). Each event is only traced the first time it is reached, so it can be marked in a loop.
+
+    Args:
+        event: description of the step
+
+    Returns: None
+    """
+    if not _trace or event in _marked:
+        return
+    _marked.add(event)
+
+    elapsed = time.time() - float(os.environ.get(LAUNCH_TIME_ENV, _import_time))
+    # One write per line, the processes share the same stderr
+    sys.stderr.write(f"[startup] {elapsed:7.3f} s  {multiprocessing.current_process().name} : {event}\n")
+    sys.stderr.flush()
@@ -0,0 +1,58 @@
+import arcade
+import pyglet
+
+
+class TextBatch:
+    """
+    Lines of text laid out once, then drawn together in a single call.
+    arcade.draw_text lays the text out again at each call, which is expensive when many lines are drawn every frame.
+    """
+
+    def __init__(self):
+        """ Creates an empty batch. The labels are only laid out once a window is open. """
+        self.batch = pyglet.graphics.Batch()
+        self.labels = []
+
+    def add(self, text, x, y, color=arcade.color.BLACK, font_size=12, bold=False, font_name=("calibri", "arial")):
+        """
+        Adds a line of text, anchored by its top left corner.
+
+        Args:
+            text: str, one line
+            x: left of the text
+            y: top of the text
+            color: color of the text
+            font_size: size of the font
+            bold: True for a bold text
+            font_name: name of the font, or tuple of names tried in order
+
+        Returns: None
+        """
+        if not text:
+            return
+        self.labels.append(pyglet.text.Label(text, x=x, y=y, color=arcade.get_four_byte_color(color),
+                                             font_name=font_name, font_size=font_size, bold=bold,
+                                             anchor_x="left", anchor_y="top", batch=self.batch))
+
+    def add_lines(self, text, x, y, line_height, **style):
+        """
+        Adds several lines of text, one below the other.
+
+        Args:
+            text: str, the lines separated by line breaks
+            x: left of the text
+            y: top of the first line
+            line_height: space between the tops of two lines
+            style: color, font_size, bold or font_name, see add
+
+        Returns: y of the line after the last one
+        """
+        for line in text.splitlines():
+            self.add(line, x, y, **style)
+            y -= line_height
+        return y
+
+    def draw(self):
+        """ Draws all the lines. """
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.batch.draw()
@@ -5,10 +5,14 @@ from kivy.uix.button import Button
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 
+from kivy.clock import Clock
 from kivy.config import Config
 from kivy.core.window import Window
 from pygments.lexers import PythonLexer
 
+import protocol
+import startup
+
 
 
 class Input(App):
@@ -19,10 +23,17 @@ class Input(App):
         self.kivy_connection = kivy_connection
         self.forbidden = forbidden
 
+        # Answers of the game are received in the background, the id tells which submission they belong to
+        self.channel = protocol.Channel(kivy_connection, on_message=self.on_message)
+        self.request_id = 0
+
         # Window parameters configuration
         Window.size = (500, 700)
         Window.clearcolor = (1, 1, 1, 1)
 
+    def on_start(self):
+        startup.mark("code window open")
+
     def build(self):
         # Config to avoid orange dots on right click
         Config.set('input', 'mouse', 'mouse,multitouch_on_demand')
@@ -57,23 +68,42 @@ class Input(App):
     def submit(self, obj):
         """
                 Is called when the submit button is pressed
-                It uses the user_instruction() function to execute the code, and
-                prints the result inside the output label
+                It sends the code to the game, which runs it with the user_instructions() pipeline.
+                The output label is filled when the answer arrives (see on_message), without waiting for it
         """
 
         # Reset output
         self.output.text = ""
+        self.output.color = "black"
+
         # Send code input to arcade
-        self.kivy_connection.send(self.code.text)
+        self.request_id += 1
+        self.channel.send(protocol.SUBMIT, self.request_id, self.code.text)
+
+    def on_message(self, message_type, request_id, payload):
+        """
+        Is called by the channel, from its thread, for each message of the game.
+        The message is displayed from the kivy thread, since widgets can only be modified there.
+        """
+        Clock.schedule_once(lambda dt: self.show_message(message_type, request_id, payload))
+
+    def show_message(self, message_type, request_id, payload):
+        """
+        Displays a message of the game inside the output label
+        """
+        # Answer to an older submission
+        if request_id != self.request_id:
+            return
 
-        # If there is some information to receive then display the output label
-        if self.kivy_connection.poll(1):
-            res = self.kivy_connection.recv()
-            if res.startswith("/!\\"):  # error output
+        if message_type == protocol.ACCEPTED:
+            self.output.text = ""
+        elif message_type == protocol.OUTPUT:
+            self.output.text += payload
+        elif message_type == protocol.RESULT:
+            if payload == protocol.ERROR:  # error output
                 self.output.color = "red"
             else:
                 self.output.color = "black"
-            self.output.text = res
 
     def reset(self, obj):
         """
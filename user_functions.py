@@ -1,5 +1,6 @@
 import arcade
-import game
+
+from constants import SCREEN_HEIGHT
 
 
 def place_block(arcade_game, x_pos, block_type="assets/backgrounds/Bois2.png"):
@@ -21,8 +22,7 @@ def place_block(arcade_game, x_pos, block_type="assets/backgrounds/Bois2.png"):
     tile_size = arcade_game.tile_size * arcade_game.level_data["scaling"]
 
     # Initialize block
-    new_block = arcade.Sprite(block_type)
-    new_block.width = new_block.height = tile_size
+    new_block = create_block(arcade_game, block_type)
     new_block.left = (x_pos + arcade_game.level_data["offset"]) * tile_size
 
     # y coord of the block is the first free available
@@ -31,12 +31,59 @@ def place_block(arcade_game, x_pos, block_type="assets/backgrounds/Bois2.png"):
     # Increment the first row available in the modified column
     arcade_game.level_data["first_free_slots"][x_pos] += 1
 
-    if new_block.bottom > game.SCREEN_HEIGHT:
+    if new_block.bottom > SCREEN_HEIGHT:
         raise ValueError("No room is available for this block at that position.")
 
-    # Update sprite list and render the new sprite
-    arcade_game.scene["Platforms"].append(new_block)
-    arcade_game.scene["Platforms"].draw()
+    add_block(arcade_game, new_block)
+
+
+def create_block(arcade_game, block_type):
+    """
+    Creates the sprite of a block, sized to the tiles of the current level.
+
+    Args:
+        arcade_game: Game object target
+        block_type: type of the block (path of its image)
+
+    Returns: arcade.Sprite
+    """
+    new_block = arcade.Sprite(block_type)
+    new_block.width = new_block.height = arcade_game.tile_size * arcade_game.level_data["scaling"]
+    # Kept to place the same block again in another process (see sandbox.apply_result)
+    new_block.block_type = block_type
+    return new_block
+
+
+def add_block(arcade_game, new_block):
+    """
+    Adds a block to the batch of blocks placed by the user code.
+
+    Args:
+        arcade_game: Game object target
+        new_block: sprite of the block, already positioned
+
+    Returns: None
+    """
+    # The block is added to the sprite list with the other blocks of the batch, once the user code has ended
+    arcade_game.pending_blocks.append(new_block)
+    arcade_game.occupancy.add_sprite(new_block)
+
+
+def commit_blocks(arcade_game):
+    """
+    Adds the blocks placed by the user code to the platforms, in one operation.
+
+    Args:
+        arcade_game: Game object target
+
+    Returns: None
+    """
+    if arcade_game.pending_blocks:
+        arcade_game.scene["Platforms"].extend(arcade_game.pending_blocks)
+        arcade_game.collision_layer.add_sprites(arcade_game.pending_blocks)
+        if arcade_game.scene_chunks is not None:
+            arcade_game.scene_chunks.add_sprites("Platforms", arcade_game.pending_blocks)
+        arcade_game.pending_blocks = []
 
 
 def is_empty(arcade_game, x_pos, y_pos):
@@ -51,10 +98,16 @@ def is_empty(arcade_game, x_pos, y_pos):
     Returns:
 
     """
+    column = x_pos + arcade_game.level_data["offset"]
+    if isinstance(column, int) and isinstance(y_pos, int):
+        return not arcade_game.occupancy.is_occupied(column, y_pos)
+
+    # Coordinates between two tiles are checked against the sprites
     tile_size = arcade_game.level_data["scaling"] * arcade_game.tile_size
-    coords = (x_pos + arcade_game.level_data["offset"]) * tile_size + 1, y_pos * tile_size + 1
+    coords = column * tile_size + 1, y_pos * tile_size + 1
     return arcade.get_sprites_at_point(coords, arcade_game.scene["Platforms"]) == [] \
-        and arcade.get_sprites_at_point(coords, arcade_game.scene["BackgroundPlatforms"]) == []
+        and arcade.get_sprites_at_point(coords, arcade_game.scene["BackgroundPlatforms"]) == [] \
+        and not any(block.collides_with_point(coords) for block in arcade_game.pending_blocks)
 
 
 def frog(arcade_game):
@@ -1,59 +1,68 @@
-import arcade
+import atexit
+import copy
 import json
+import os
+import tempfile
+import threading
+import time
+
+# Path of the save file, can be changed with the GAME_SAVE environment variable
+SAVE_PATH = os.environ.get("GAME_SAVE", "save.json")
+
+# Time a change of the save waits for the next ones before being written, in seconds
+SAVE_DELAY = 2.
+
+_save_writer = None
 
 
 def compute_first_free_slots(arcade_game):
     """
     Computes the first_free_slots list containing the first y coordinate available to place a block for each x position.
-    The function computes the list for the current level.
+    The function computes the list for the current level, from the layers of its map : the tiles are checked against
+    the hit boxes of their sprites, like place_block and is_empty do.
     It should be used only once each time a level is edited and is not a user feature.
     The list is saved in levels.json file.
-    If an element of the list is -1, it means the column is full.
 
     Args:
         arcade_game: game instance
 
     Returns: List (first_free_slots)
     """
-    first_free_slots = []
-    tile_size = arcade_game.tile_size * arcade_game.level_data["scaling"]
-    offset = arcade_game.level_data["offset"]
-
-    # Calculate the number of rows of blocks in the level
-    columns_num = int(arcade_game.screen_resolution[0] // tile_size)
-
-    # For each column, get first free vertical slot
-    for column in range(offset, columns_num):
-        # Get the first row available of the column
-        current_row = 0
-        column_coord = column * tile_size
-        row_coord = current_row * tile_size
-
-        # Check if the first row is immediately free
-        if not (arcade.get_sprites_at_point(
-                (column_coord + 1, row_coord + 1), arcade_game.scene["Platforms"])
-                or
-                arcade.get_sprites_at_point(
-                    (column_coord + 1, row_coord + 1), arcade_game.scene["BackgroundPlatforms"])):
-            # + 1 on the coords makes sure we're not checking at zero which will never be True
-            free = True
-        else:
-            free = False
-
-        # Check if the row above is free, repeat until one is
-        while not free:
-            current_row += 1
-            row_coord = current_row * tile_size
-            if not (arcade.get_sprites_at_point(
-                    (column_coord + 1, row_coord + 1), arcade_game.scene["Platforms"])
-                    or
-                    arcade.get_sprites_at_point(
-                        (column_coord + 1, row_coord + 1), arcade_game.scene["BackgroundPlatforms"])):
-                free = True
-
-        first_free_slots.append(current_row)
-
-    return first_free_slots
+    import occupancy
+    from levelpack import OCCUPANCY_LAYERS
+
+    scaled_tile_size = arcade_game.tile_size * arcade_game.level_data["scaling"]
+    columns_num = int(arcade_game.screen_resolution[0] // scaled_tile_size)
+    occupied = occupancy.tile_occupancy(arcade_game.tile_map.tiled_map, arcade_game.level_data["scaling"],
+                                        OCCUPANCY_LAYERS, scaled_tile_size, columns_num)
+    return occupancy.first_free_rows(occupied, arcade_game.level_data["offset"], columns_num)
+
+
+def compute_all_free_slots(levels_path="levels.json", screen_width=1000):
+    """
+    Computes the first_free_slots lists of every level and saves them in the levels file, in one go.
+    No game window is needed : the levels are processed like preprocess_levels.py does.
+
+    Args:
+        levels_path: path of the levels file
+        screen_width: width of the screen in pixels
+
+    Returns: List of the first_free_slots lists
+    """
+    import preprocess_levels
+
+    with open(levels_path, "r") as read_levels_file:
+        levels = json.loads(read_levels_file.read())
+
+    all_free_slots = [derived["first_free_slots"]
+                      for derived in preprocess_levels.preprocess_levels(levels, screen_width=screen_width)]
+    for level_data, first_free_slots in zip(levels, all_free_slots):
+        level_data["first_free_slots"] = first_free_slots
+
+    with open(levels_path, "w") as levels_file:
+        json.dump(levels, levels_file, indent=2)
+
+    return all_free_slots
 
 
 def save_free_slots(arcade_game):
@@ -73,21 +82,145 @@ def save_free_slots(arcade_game):
     # Print in console (again, this should not be performed by players)
     print(first_free_slots)
 
-    # Update the levels.json file
+    # Update the levels.json file ; the loaded levels are shared by the cache and must not be modified
     arcade_game.level_data["first_free_slots"] = first_free_slots
+    levels = copy.deepcopy(arcade_game.levels)
+    levels[arcade_game.save["current_level"]]["first_free_slots"] = first_free_slots
 
     with open("levels.json", "w") as levels_file:
-        json.dump(arcade_game.levels, levels_file, indent=2)
+        json.dump(levels, levels_file, indent=2)
+
+
+def write_atomic(path, data):
+    """
+    Writes a file atomically : the data is written to a temporary file, which then replaces the file. The file is
+    never left half-written, even if the game crashes.
+
+    Args:
+        path: path of the file
+        data: str written
+
+    Returns: None
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".save-", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w") as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class SaveWriter:
+    """
+    Writes the save file from a background thread. Successive changes are coalesced : the save is written the delay
+    after the first change not written yet, or right away when requested so (level transition). flush writes it from the
+    calling thread instead, before the game exits.
+    """
+
+    def __init__(self, path=SAVE_PATH, delay=SAVE_DELAY):
+        """
+        Starts the background thread.
+
+        Args:
+            path: path of the save file
+            delay: time a change waits for the next ones before being written, in seconds
+        """
+        self.path = path
+        self.delay = delay
+
+        # Last save not written yet, and the time it should be written at
+        self.pending = None
+        self.deadline = None
+        self.condition = threading.Condition()
+        # Only one thread writes the file at a time
+        self.write_lock = threading.Lock()
+
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def request(self, save, immediate=False):
+        """
+        Queues a save, to be written after the delay. A save already queued keeps its deadline if it is earlier, so a
+        change right after an immediate request does not delay it.
+
+        Args:
+            save: dict of the save, copied
+            immediate: if True, the background thread writes it right away instead of waiting for the delay
+
+        Returns: None
+        """
+        with self.condition:
+            deadline = time.monotonic() + (0 if immediate else self.delay)
+            if self.pending is not None:
+                deadline = min(self.deadline, deadline)
+            self.pending = copy.deepcopy(save)
+            self.deadline = deadline
+            self.condition.notify()
+
+    def flush(self):
+        """ Writes the queued save now, from the calling thread. """
+        with self.write_lock:
+            with self.condition:
+                save, self.pending = self.pending, None
+            if save is not None:
+                write_atomic(self.path, json.dumps(save, indent=2))
+
+    def run(self):
+        """ Writes the queued saves once their delay is over. Runs in the background thread. """
+        while True:
+            with self.condition:
+                while self.pending is None or time.monotonic() < self.deadline:
+                    self.condition.wait(None if self.pending is None else self.deadline - time.monotonic())
+            self.flush()
+
+
+def get_save_writer():
+    """
+    Returns the save writer of the game, started on the first call. The queued save is written when the game exits.
+
+    Returns: SaveWriter
+    """
+    global _save_writer
+    if _save_writer is None:
+        _save_writer = SaveWriter()
+        atexit.register(flush_save)
+    return _save_writer
+
+
+def flush_save():
+    """
+    Writes the queued save now, from the calling thread, if the save writer is started. The atexit handlers are not
+    run by the process of the game (a multiprocessing child), which calls it once its window is closed.
+
+    Returns: None
+    """
+    if _save_writer is not None:
+        _save_writer.flush()
+
+
+def read_save():
+    """
+    Reads the save file.
+
+    Returns: dict of the save
+    """
+    with open(get_save_writer().path, "r") as read_save_file:
+        return json.loads(read_save_file.read())
 
 
-def write_save(arcade_game):
+def write_save(arcade_game, flush=False):
     """
-    Writes in the save.json file the new save file. Called when the game is closed.
+    Saves the progress of the player. The save file is written in the background, once the progress stops changing ;
+    the writes of a series of resets are coalesced.
 
     Args:
         arcade_game: arcade game instance object
+        flush: if True, the save file is written right away by the background thread (level transition, exit)
 
     Returns:
     """
-    with open("save.json", "w") as save_file:
-        json.dump(arcade_game.save, save_file, indent=2)
+    get_save_writer().request(arcade_game.save, immediate=flush)
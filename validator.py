@@ -0,0 +1,146 @@
+import ast
+import json
+from collections import namedtuple
+
+UNSAFE_WORDS_PATH = "assets/text/unsafe_words.json"
+
+# Syntax elements matching a forbidden word ; any other word is the name of a forbidden variable or function
+WORD_NODES = {
+    "def": (ast.FunctionDef, ast.AsyncFunctionDef),
+    "return": (ast.Return,),
+    "import": (ast.Import, ast.ImportFrom),
+    "from": (ast.ImportFrom,),
+    "class": (ast.ClassDef,),
+    "lambda": (ast.Lambda,),
+    "for": (ast.For, ast.AsyncFor, ast.comprehension),
+    "while": (ast.While,),
+    "if": (ast.If, ast.IfExp),
+    "try": (ast.Try,),
+    "with": (ast.With, ast.AsyncWith),
+    "global": (ast.Global,),
+    "nonlocal": (ast.Nonlocal,),
+    "del": (ast.Delete,),
+    "yield": (ast.Yield, ast.YieldFrom),
+    "await": (ast.Await,),
+    "assert": (ast.Assert,),
+    "raise": (ast.Raise,),
+    "[": (ast.List, ast.ListComp, ast.Subscript),
+    "]": (ast.List, ast.ListComp, ast.Subscript),
+    "{": (ast.Dict, ast.Set, ast.DictComp, ast.SetComp, ast.FormattedValue),
+    "}": (ast.Dict, ast.Set, ast.DictComp, ast.SetComp, ast.FormattedValue),
+}
+
+# Names forbidden in every level, whatever its rules : they give access to the modules, the files and the code of the
+# game. Names and attributes written like __name__ are always forbidden as well.
+ALWAYS_FORBIDDEN_NAMES = {"__import__", "eval", "exec", "compile", "getattr", "setattr", "delattr", "open", "globals",
+                          "locals", "vars", "breakpoint"}
+
+# Forbidden instruction found in the code, with its position
+Violation = namedtuple("Violation", ["word", "lineno", "col_offset"])
+
+_unsafe_words = None
+_rule_sets = {}
+
+
+def get_unsafe_words():
+    """
+    Returns the words forbidden in every level, read from disk on the first call only.
+
+    Returns: list of str
+    """
+    global _unsafe_words
+    if _unsafe_words is None:
+        with open(UNSAFE_WORDS_PATH, "r") as unsafe_json:
+            _unsafe_words = json.loads(unsafe_json.read())
+    return _unsafe_words
+
+
+class RuleSet:
+    """ Forbidden instructions of a level, compiled into the syntax elements and names to look for. """
+
+    def __init__(self, words):
+        """
+        Compiles the rules.
+
+        Args:
+            words: list of forbidden words (keywords, brackets or names)
+        """
+        # Word forbidding each type of syntax element
+        self.node_words = {}
+        # Forbidden names of variables, functions and attributes
+        self.names = set(ALWAYS_FORBIDDEN_NAMES)
+
+        for word in words:
+            if word in WORD_NODES:
+                for node_type in WORD_NODES[word]:
+                    self.node_words.setdefault(node_type, word)
+            else:
+                self.names.add(word)
+
+    def is_forbidden_name(self, name):
+        """
+        Checks if a variable, function or attribute name is forbidden.
+
+        Args:
+            name: str
+
+        Returns: bool
+        """
+        return name in self.names or (name.startswith("__") and name.endswith("__"))
+
+    def check(self, tree):
+        """
+        Looks for the forbidden instructions of a parsed code.
+
+        Args:
+            tree: ast.Module of the code
+
+        Returns: list of Violation, sorted by position in the code
+        """
+        violations = []
+        for node in ast.walk(tree):
+            word = self.node_words.get(type(node))
+            if word is None:
+                if isinstance(node, ast.Name) and self.is_forbidden_name(node.id):
+                    word = node.id
+                elif isinstance(node, ast.Attribute) and self.is_forbidden_name(node.attr):
+                    word = node.attr
+                else:
+                    continue
+
+            # comprehension nodes have no position, the one of their target is used
+            position = node.target if isinstance(node, ast.comprehension) else node
+            violations.append(Violation(word, position.lineno, position.col_offset))
+
+        return sorted(violations, key=lambda violation: (violation.lineno, violation.col_offset))
+
+
+def get_rules(level_data, forbidden=None):
+    """
+    Returns the rule set of a level, compiled on the first call only.
+
+    Args:
+        level_data: dict, data of the level
+        forbidden: list of words forbidden on top of those of the level
+
+    Returns: RuleSet
+    """
+    words = tuple(level_data["forbidden_functions"]) + tuple(forbidden or ()) + tuple(get_unsafe_words())
+    if words not in _rule_sets:
+        _rule_sets[words] = RuleSet(words)
+    return _rule_sets[words]
+
+
+def validate(code, rules):
+    """
+    Parses the code and checks it against a rule set.
+
+    Args:
+        code: str containing code performed by user
+        rules: RuleSet of the level
+
+    Returns: tuple (tree, violations), tree being the ast.Module of the code
+    Raises: SyntaxError if the code cannot be parsed.
+    """
+    tree = ast.parse(code)
+    return tree, rules.check(tree)